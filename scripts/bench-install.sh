@@ -0,0 +1,252 @@
+#!/usr/bin/env bash
+# KarmaOS installer throughput benchmark
+# Times the disk-bound steps of what Calamares does between "Install" and
+# "Finished" against a sparse disk image, as the invoking user and without
+# touching real disks:
+#   partition   sfdisk: GPT with an ESP and an ext4 root      (partition)
+#   unpack      unsquashfs of filesystem.squashfs             (unpackfsc)
+#   populate    mkfs.ext4 -d of the tree at the root offset   (unpackfsc)
+#   esp         grub-mkimage + FAT ESP written with mtools
+#   flush       writeback of the disk image                   (umount)
+# and reports time and throughput per stage, so squashfs compression, block
+# size and layout can be judged by what they cost at install time.
+#
+# The esp stage only writes a GRUB EFI image and a minimal grub.cfg. It is not
+# Calamares' bootloader module, which runs grub-install and grub-mkconfig
+# (os-prober included) chrooted in the target: that needs root and a loop
+# device, and is not measured here.
+#
+# Usage: scripts/bench-install.sh [options] <iso|squashfs> [<iso|squashfs>...]
+#   --variant OPTS   also bench the first image rebuilt with these mksquashfs
+#                    options, or with a flavor's settings (repeatable):
+#                    --variant lite --variant "-comp lz4 -b 256K"
+#   --disk-gib N     sparse disk image size (default 40)
+#   --workdir DIR    scratch space, needs room for one unpacked tree (default /var/tmp)
+#   --processors N   unsquashfs/mksquashfs threads (default: all CPUs)
+#   --drop-caches    drop the page cache before each image (sudo)
+#
+# The tree is unpacked as the invoking user, so ownership is not restored and
+# device nodes are skipped; the data written is the same. Real installs unpack
+# straight into the target filesystem, here that is unpack + populate.
+# Results are also appended to dist/install-bench.tsv.
+#
+# Needs: squashfs-tools, fdisk, e2fsprogs, dosfstools, mtools,
+#        grub-efi-amd64-bin, xorriso (ISO inputs)
+
+set -euo pipefail
+
+DISK_GIB=40
+WORK_ROOT="/var/tmp"
+PROCESSORS="$(nproc)"
+DROP_CACHES=0
+VARIANTS=()
+IMAGES=()
+while [[ $# -gt 0 ]]; do
+    case "$1" in
+        --variant) VARIANTS+=("$2"); shift 2 ;;
+        --disk-gib) DISK_GIB="$2"; shift 2 ;;
+        --workdir) WORK_ROOT="$2"; shift 2 ;;
+        --processors) PROCESSORS="$2"; shift 2 ;;
+        --drop-caches) DROP_CACHES=1; shift ;;
+        *) IMAGES+=("$1"); shift ;;
+    esac
+done
+
+if [[ ${#IMAGES[@]} -eq 0 ]]; then
+    echo "Usage: $0 [--variant OPTS]... [--disk-gib N] [--workdir DIR] <iso|squashfs> [...]"
+    echo "Example: $0 --variant lite dist/karmaos-26.01-amd64.iso"
+    exit 1
+fi
+
+for tool in unsquashfs mksquashfs sfdisk mkfs.ext4 mkfs.vfat mmd mcopy grub-mkimage; do
+    if ! command -v "${tool}" &> /dev/null; then
+        echo "ERROR: ${tool} not found"
+        echo "Install with: sudo apt-get install squashfs-tools fdisk e2fsprogs dosfstools mtools grub-efi-amd64-bin xorriso"
+        exit 1
+    fi
+done
+
+ESP_MIB=512
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+RESULTS="$(pwd)/dist/install-bench.tsv"
+WORK="$(mktemp -d "${WORK_ROOT}/karmaos-bench-install.XXXXXX")"
+trap 'rm -rf "${WORK}"' EXIT
+
+now_ms() {
+    echo $(( $(date +%s%N) / 1000000 ))
+}
+
+# mib_s <bytes> <ms>: throughput in MiB/s
+mib_s() {
+    awk -v b="$1" -v ms="$2" 'BEGIN { printf "%.1f", ms > 0 ? b / 1048576 / (ms / 1000) : 0 }'
+}
+
+secs() {
+    awk -v ms="$1" 'BEGIN { printf "%.1f", ms / 1000 }'
+}
+
+# variant_options <flavor|options>: mksquashfs options, as build-iso.sh uses them
+variant_options() {
+    local conf="${SCRIPT_DIR}/flavors/$1.conf"
+    if [[ -f "${conf}" ]]; then
+        (
+            FLAVOR_SQUASHFS_COMP="-comp xz -Xbcj x86"
+            FLAVOR_SQUASHFS_BLOCK="1M"
+            # shellcheck disable=SC1090
+            source "${conf}"
+            echo "${FLAVOR_SQUASHFS_COMP} -b ${FLAVOR_SQUASHFS_BLOCK}"
+        )
+    else
+        echo "$1"
+    fi
+}
+
+# unpack_tree <squashfs> <dir>: exit status 2 is only non-fatal errors (device nodes)
+unpack_tree() {
+    local rc=0
+    unsquashfs -n -no-xattrs -p "${PROCESSORS}" -d "$2" "$1" > "${WORK}/unsquashfs.log" 2>&1 || rc=$?
+    if [[ ${rc} -ne 0 && ${rc} -ne 2 ]]; then
+        tail -n 20 "${WORK}/unsquashfs.log"
+        return 1
+    fi
+}
+
+# squashfs_of <iso|squashfs>: path of the squashfs to bench
+squashfs_of() {
+    local out
+    if [[ "$1" == *.iso ]]; then
+        if ! command -v xorriso &> /dev/null; then
+            echo "ERROR: xorriso not found (sudo apt-get install xorriso)" >&2
+            return 1
+        fi
+        out="${WORK}/$(basename "$1" .iso).squashfs"
+        xorriso -osirrox on -indev "$1" -extract /casper/filesystem.squashfs "${out}" > /dev/null 2>&1
+        echo "${out}"
+    else
+        echo "$1"
+    fi
+}
+
+# bench <squashfs> <label>
+bench() {
+    local squashfs="$1" label="$2"
+    local disk="${WORK}/disk.img" tree="${WORK}/tree" esp="${WORK}/esp.img"
+    local t0 t_part t_unpack t_populate t_esp t_flush
+    local comp block sqfs_bytes tree_bytes esp_start root_start root_size root_uuid
+    local grub_efi="${WORK}/grubx64.efi" grub_cfg="${WORK}/grub.cfg"
+
+    comp=$(unsquashfs -s "${squashfs}" | awk '/^Compression/ {print $2}')
+    block=$(unsquashfs -s "${squashfs}" | awk '/^Block size/ {print $3 / 1024 "K"}')
+    sqfs_bytes=$(stat -c %s "${squashfs}")
+
+    if [[ "${DROP_CACHES}" -eq 1 ]]; then
+        sync
+        echo 3 | sudo tee /proc/sys/vm/drop_caches > /dev/null
+    fi
+    rm -rf "${disk}" "${tree}" "${esp}"
+
+    # partition: blank sparse disk, GPT with ESP + root
+    t0=$(now_ms)
+    truncate -s "${DISK_GIB}G" "${disk}"
+    sfdisk --quiet "${disk}" <<EOF
+label: gpt
+size=${ESP_MIB}MiB, type=U
+type=L
+EOF
+    t_part=$(( $(now_ms) - t0 ))
+    # "<disk>1 : start=   2048, size= 1048576, type=..." (sectors)
+    read -r esp_start < <(sfdisk -d "${disk}" | awk -F'[=,]' '$1 ~ /1 : start$/ {print $2 + 0}')
+    read -r root_start root_size < <(sfdisk -d "${disk}" | awk -F'[=,]' '$1 ~ /2 : start$/ {print $2 + 0, $4 + 0}')
+
+    # unpack: what unsquashfs costs with this compressor and block size
+    t0=$(now_ms)
+    unpack_tree "${squashfs}" "${tree}"
+    t_unpack=$(( $(now_ms) - t0 ))
+    tree_bytes=$(du -sb "${tree}" | cut -f1)
+    # Modes like 0400 would keep mkfs.ext4 from reading the user-owned copy
+    chmod -R u+rwX "${tree}"
+
+    # populate: write the tree into the root partition
+    root_uuid=$(cat /proc/sys/kernel/random/uuid)
+    t0=$(now_ms)
+    mkfs.ext4 -q -F -U "${root_uuid}" -E "offset=$((root_start * 512))" -d "${tree}" \
+        "${disk}" "$((root_size / 2))k"
+    t_populate=$(( $(now_ms) - t0 ))
+    rm -rf "${tree}"
+
+    # esp: GRUB EFI image and a minimal config on a FAT ESP
+    t0=$(now_ms)
+    grub-mkimage -o "${grub_efi}" -p /EFI/BOOT -O x86_64-efi \
+        fat part_gpt ext2 normal linux search search_fs_uuid all_video gfxterm test
+    mkfs.vfat -C "${esp}" $((ESP_MIB * 1024)) > /dev/null
+    mmd -i "${esp}" ::/EFI ::/EFI/BOOT
+    mcopy -i "${esp}" "${grub_efi}" ::/EFI/BOOT/BOOTX64.EFI
+    printf 'search --fs-uuid --set=root %s\nlinux /boot/vmlinuz root=UUID=%s ro quiet splash\ninitrd /boot/initrd.img\nboot\n' \
+        "${root_uuid}" "${root_uuid}" > "${grub_cfg}"
+    mcopy -i "${esp}" "${grub_cfg}" ::/EFI/BOOT/grub.cfg
+    dd if="${esp}" of="${disk}" bs=1M seek="$((esp_start * 512))" oflag=seek_bytes \
+        conv=notrunc,sparse status=none
+    t_esp=$(( $(now_ms) - t0 ))
+    rm -f "${esp}" "${grub_efi}" "${grub_cfg}"
+
+    # flush: like Calamares' umount, wait for the data to reach the disk
+    t0=$(now_ms)
+    sync -f "${disk}"
+    t_flush=$(( $(now_ms) - t0 ))
+    rm -f "${disk}"
+
+    local total=$(( t_part + t_unpack + t_populate + t_esp + t_flush ))
+    echo ""
+    echo "==> ${label}: ${comp}, ${block} blocks, $((sqfs_bytes / 1048576)) MiB," \
+         "$((tree_bytes / 1048576)) MiB unpacked"
+    printf "  %-11s %8s s\n" partition "$(secs "${t_part}")"
+    printf "  %-11s %8s s  %8s MiB/s written  %8s MiB/s read\n" unpack "$(secs "${t_unpack}")" \
+        "$(mib_s "${tree_bytes}" "${t_unpack}")" "$(mib_s "${sqfs_bytes}" "${t_unpack}")"
+    printf "  %-11s %8s s  %8s MiB/s\n" populate "$(secs "${t_populate}")" \
+        "$(mib_s "${tree_bytes}" "${t_populate}")"
+    printf "  %-11s %8s s\n" esp "$(secs "${t_esp}")"
+    printf "  %-11s %8s s\n" flush "$(secs "${t_flush}")"
+    printf "  %-11s %8s s  %8s MiB/s end to end\n" total "$(secs "${total}")" \
+        "$(mib_s "${tree_bytes}" "${total}")"
+
+    mkdir -p "$(dirname "${RESULTS}")"
+    if [[ ! -f "${RESULTS}" ]]; then
+        printf 'date\timage\tcompression\tblock\tsquashfs_bytes\ttree_bytes\tpartition_ms\tunpack_ms\tpopulate_ms\tesp_ms\tflush_ms\ttotal_ms\n' \
+            > "${RESULTS}"
+    fi
+    printf '%s\t%s\t%s\t%s\t%d\t%d\t%d\t%d\t%d\t%d\t%d\t%d\n' "$(date -u +%FT%TZ)" "${label}" \
+        "${comp}" "${block}" "${sqfs_bytes}" "${tree_bytes}" \
+        "${t_part}" "${t_unpack}" "${t_populate}" "${t_esp}" "${t_flush}" "${total}" >> "${RESULTS}"
+}
+
+echo "==> KarmaOS install benchmark ($(nproc) CPU, $(awk '/MemTotal/ {print int($2/1024)}' /proc/meminfo) MiB RAM," \
+     "${PROCESSORS} unsquashfs threads, scratch in ${WORK})"
+
+FIRST_SQUASHFS=""
+for image in "${IMAGES[@]}"; do
+    squashfs=$(squashfs_of "${image}")
+    FIRST_SQUASHFS="${FIRST_SQUASHFS:-${squashfs}}"
+    bench "${squashfs}" "$(basename "${image}")"
+done
+
+# Variants are rebuilt from the first image, then benched the same way
+if [[ ${#VARIANTS[@]} -gt 0 ]]; then
+    echo ""
+    echo "==> Unpacking $(basename "${FIRST_SQUASHFS}") to rebuild the variants..."
+    unpack_tree "${FIRST_SQUASHFS}" "${WORK}/variant-src"
+    for variant in "${VARIANTS[@]}"; do
+        options=$(variant_options "${variant}")
+        out="${WORK}/variant.squashfs"
+        rm -f "${out}"
+        t0=$(now_ms)
+        # shellcheck disable=SC2086
+        mksquashfs "${WORK}/variant-src" "${out}" ${options} -no-duplicates \
+            -processors "${PROCESSORS}" -no-progress > /dev/null
+        echo "==> Variant '${variant}' (${options}): built in $(secs $(( $(now_ms) - t0 ))) s"
+        bench "${out}" "variant ${variant}"
+        rm -f "${out}"
+    done
+fi
+
+echo ""
+echo "==> Results appended to ${RESULTS}"
@@ -0,0 +1,83 @@
+#!/usr/bin/env bash
+# KarmaOS Welcome memory benchmark
+# Measures the RSS of the wizard and all of its child processes (WebKit web
+# and network processes included) for each memory profile. The wizard is
+# forced into live mode, so the resources page exists on any host.
+#
+# Usage: scripts/bench-welcome-rss.sh [settle-seconds]
+# Needs: python3-gi, gir1.2-gtk-3.0, gir1.2-webkit2-4.1, xvfb (xvfb-run)
+
+set -euo pipefail
+
+SETTLE="${1:-8}"
+GUI="$(pwd)/snaps/karmaos-welcome/src/karmaos-welcome-gui.py"
+WEB_PAGE=5      # "Ressources KarmaOS"
+CHOICE_PAGE=4   # page shown after leaving the resources page
+
+if ! command -v xvfb-run &> /dev/null; then
+    echo "ERROR: xvfb-run not found (sudo apt-get install xvfb)"
+    exit 1
+fi
+
+# A process and all of its descendants, one PID per line
+tree_pids() {
+    local pid="$1" child
+    echo "${pid}"
+    for child in $(pgrep -P "${pid}" || true); do
+        tree_pids "${child}"
+    done
+}
+
+# Sum VmRSS (kB) over a list of PIDs
+sum_rss() {
+    local total=0 pid rss
+    for pid in "$@"; do
+        rss=$(awk '/^VmRSS:/ {print $2}' "/proc/${pid}/status" 2>/dev/null || echo 0)
+        total=$((total + ${rss:-0}))
+    done
+    echo "${total}"
+}
+
+# Count the WebKit processes among a list of PIDs, so a browser running on
+# the same machine is not counted
+count_webkit() {
+    local count=0 pid comm
+    for pid in "$@"; do
+        comm=$(cat "/proc/${pid}/comm" 2>/dev/null || true)
+        [[ "${comm}" == WebKit* ]] && count=$((count + 1))
+    done
+    echo "${count}"
+}
+
+# run_case <label> <profile> <pages>: "5,4" opens page 5, then leaves for page 4
+# halfway through the settle time
+run_case() {
+    local label="$1" profile="$2" page="$3" pid pids rss procs
+    KARMAOS_WELCOME_LIVE=1 \
+    KARMAOS_WELCOME_MEMORY_PROFILE="${profile}" \
+    KARMAOS_WELCOME_PAGE="${page}" \
+    KARMAOS_WELCOME_PAGE_DELAY="$((SETTLE / 2))" \
+    KARMAOS_WELCOME_RESOURCES_URL="http://127.0.0.1:9/" \
+        xvfb-run -a python3 "${GUI}" > /dev/null 2>&1 &
+    local runner=$!
+    sleep "${SETTLE}"
+    pid=$(pgrep -f -n "python3 ${GUI}" || true)
+    if [[ -z "${pid}" ]]; then
+        echo "ERROR: wizard did not start for case ${label}"
+        kill "${runner}" 2>/dev/null || true
+        return 1
+    fi
+    mapfile -t pids < <(tree_pids "${pid}")
+    rss=$(sum_rss "${pids[@]}")
+    procs=$(count_webkit "${pids[@]}")
+    printf "%-28s %-9s %8d MiB %6s\n" "${label}" "${profile}" $((rss / 1024)) "${procs}"
+    kill "${pid}" 2>/dev/null || true
+    wait "${runner}" 2>/dev/null || true
+}
+
+echo "==> KarmaOS Welcome RSS benchmark (settle ${SETTLE}s, $(nproc) CPU, $(awk '/MemTotal/ {print int($2/1024)}' /proc/meminfo) MiB RAM)"
+printf "%-28s %-9s %12s %6s\n" "case" "profile" "tree RSS" "WebKit"
+run_case "resources page" standard "${WEB_PAGE}"
+run_case "resources page" low "${WEB_PAGE}"
+run_case "resources page, then left" standard "${WEB_PAGE},${CHOICE_PAGE}"
+run_case "choice page (no WebView)" standard "${CHOICE_PAGE}"
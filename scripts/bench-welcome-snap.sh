@@ -0,0 +1,146 @@
+#!/usr/bin/env bash
+# KarmaOS Welcome snap benchmark
+# Size breakdown of one or more karmaos-welcome snaps, the size change of each
+# against the first one and, for each of them, the time from launch to the
+# first frame on screen: first run after install, cold (page cache dropped)
+# and warm.
+#
+# Usage: scripts/bench-welcome-snap.sh [--runs N] [--no-timing] <snap> [<snap>...]
+#   Compare the previous build with the new one:
+#   scripts/bench-welcome-snap.sh old/karmaos-welcome_26.01_amd64.snap \
+#       snaps/karmaos-welcome/karmaos-welcome_26.01_amd64.snap
+#
+# Timing installs each snap in turn (snap install --dangerous) and drops the
+# page cache, so it needs sudo and a test machine.
+# Needs: squashfs-tools, xvfb (timing only)
+
+set -euo pipefail
+
+RUNS=5
+TIMING=1
+SNAPS=()
+while [[ $# -gt 0 ]]; do
+    case "$1" in
+        --runs) RUNS="$2"; shift 2 ;;
+        --no-timing) TIMING=0; shift ;;
+        *) SNAPS+=("$1"); shift ;;
+    esac
+done
+
+if [[ ${#SNAPS[@]} -eq 0 ]]; then
+    echo "Usage: $0 [--runs N] [--no-timing] <snap> [<snap>...]"
+    exit 1
+fi
+
+if ! command -v unsquashfs &> /dev/null; then
+    echo "ERROR: unsquashfs not found (sudo apt-get install squashfs-tools)"
+    exit 1
+fi
+
+# dir_sizes <snap>: "<dir>\t<bytes>\t<files>" per directory (two levels)
+dir_sizes() {
+    unsquashfs -lls "$1" | awk '
+        $1 ~ /^-/ {
+            path = $NF
+            sub(/^squashfs-root\//, "", path)
+            n = split(path, parts, "/")
+            key = (n > 2) ? parts[1] "/" parts[2] : (n == 2 ? parts[1] : ".")
+            size[key] += $3
+            files[key]++
+        }
+        END { for (k in size) printf "%s\t%d\t%d\n", k, size[k], files[k] }'
+}
+
+# size_breakdown <snap>: file bytes per directory, largest first
+size_breakdown() {
+    local snap="$1"
+    echo "==> $(basename "${snap}"): $(( $(stat -c %s "${snap}") / 1024 )) KiB packed"
+    dir_sizes "${snap}" | sort -t$'\t' -k2,2nr | awk -F'\t' '
+        { printf "  %10.1f KiB  %s\n", $2 / 1024, $1; total += $2; files += $3 }
+        END { printf "  %10.1f KiB  total (%d files)\n", total / 1024, files }'
+    echo "    .py: $(unsquashfs -l "${snap}" | grep -c '\.py$' || true)," \
+         ".pyc: $(unsquashfs -l "${snap}" | grep -c '\.pyc$' || true)"
+}
+
+# size_diff <old> <new>: packed and per-directory growth from old to new
+size_diff() {
+    local old="$1" new="$2"
+    echo "==> $(basename "${old}") -> $(basename "${new}"):" \
+         "$(printf '%+d' $(( ($(stat -c %s "${new}") - $(stat -c %s "${old}")) / 1024 ))) KiB packed"
+    awk -F'\t' 'NR == FNR { before[$1] = $2; keys[$1]; next }
+        { after[$1] = $2; keys[$1] }
+        END {
+            for (k in keys) {
+                delta = after[k] - before[k]
+                total += delta
+                if (delta != 0) printf "  %+10.1f KiB  %s\n", delta / 1024, k | "sort -gr"
+            }
+            close("sort -gr")
+            printf "  %+10.1f KiB  total\n", total / 1024
+        }' <(dir_sizes "${old}") <(dir_sizes "${new}")
+}
+
+for snap in "${SNAPS[@]}"; do
+    size_breakdown "${snap}"
+    echo ""
+done
+
+# Every later snap against the first one (the previous build)
+for snap in "${SNAPS[@]:1}"; do
+    size_diff "${SNAPS[0]}" "${snap}"
+    echo ""
+done
+
+if [[ "${TIMING}" -eq 0 ]]; then
+    exit 0
+fi
+
+if ! command -v Xvfb &> /dev/null; then
+    echo "ERROR: Xvfb not found (sudo apt-get install xvfb)"
+    exit 1
+fi
+
+DISPLAY_NUM=":$(( 90 + RANDOM % 100 ))"
+Xvfb "${DISPLAY_NUM}" -screen 0 1280x800x24 > /dev/null 2>&1 &
+XVFB_PID=$!
+trap 'kill "${XVFB_PID}" 2>/dev/null || true' EXIT
+sleep 1
+
+# launch_ms: milliseconds until the wizard has drawn its first frame and quit
+launch_ms() {
+    local start end
+    start=$(date +%s%N)
+    DISPLAY="${DISPLAY_NUM}" KARMAOS_WELCOME_EXIT_AFTER_START=1 \
+        timeout 120 snap run karmaos-welcome > /dev/null 2>&1 || true
+    end=$(date +%s%N)
+    echo $(( (end - start) / 1000000 ))
+}
+
+drop_caches() {
+    sync
+    echo 3 | sudo tee /proc/sys/vm/drop_caches > /dev/null
+}
+
+# stats <values...>: "min median"
+stats() {
+    printf "%s\n" "$@" | sort -n | awk '{v[NR] = $1} END {print v[1], v[int((NR + 1) / 2)]}'
+}
+
+printf "\n%-40s %8s %16s %16s\n" "snap" "first" "cold min/med" "warm min/med"
+for snap in "${SNAPS[@]}"; do
+    sudo snap install --dangerous "${snap}" > /dev/null
+    drop_caches
+    first=$(launch_ms)
+    cold=() warm=()
+    for _ in $(seq 1 "${RUNS}"); do
+        drop_caches
+        cold+=("$(launch_ms)")
+    done
+    for _ in $(seq 1 "${RUNS}"); do
+        warm+=("$(launch_ms)")
+    done
+    read -r cold_min cold_med < <(stats "${cold[@]}")
+    read -r warm_min warm_med < <(stats "${warm[@]}")
+    printf "%-40s %6s ms %7s/%-5s ms %7s/%-5s ms\n" "$(basename "${snap}")" "${first}" \
+        "${cold_min}" "${cold_med}" "${warm_min}" "${warm_med}"
+done
@@ -1,78 +1,236 @@
 #!/usr/bin/env bash
 # KarmaOS 26.01 ISO Builder
 # Creates a BOOTABLE hybrid ISO (UEFI + BIOS) for VirtualBox, QEMU, UTM, real hardware
+#
+# One shared base chroot (cached between builds) is turned into one ISO per
+# flavor (scripts/flavors/*.conf): each flavor is a copy-on-write overlay on
+# the base, and the flavors' squashfs/ISO stages run concurrently.
+#
+# Environment:
+#   KARMAOS_FLAVORS="default lite"  flavors to build (default: default)
+#   KARMAOS_VERSION, KARMAOS_CODENAME  release (26.01, noble)
+#   KARMAOS_CACHE_DIR          base chroot cache (./cache)
+#   KARMAOS_BASE_MAX_AGE_DAYS  rebuild the cached base when older (7)
+#   KARMAOS_FAST_BUILD=1       dpkg force-unsafe-io during the build (never shipped),
+#                              build tree (and a base being rebuilt) on tmpfs if
+#                              KARMAOS_TMPFS_MIN_GIB (20) are free
+#   KARMAOS_OUTPUT_DIR         where ISOs and reports go (./dist)
+#   KARMAOS_KEEP_BUILD=1       keep build/<id>/ (flavor layers, ISO trees) until the
+#                              next build starts
+#
+# Several builds can run side by side on one host (give each its own
+# KARMAOS_OUTPUT_DIR): every build works in its own build/<id>/ tree, and all
+# of its mounts (chroot binds, overlays, tmpfs) live in a private mount
+# namespace, so they are invisible to the host and to the other builds and
+# disappear with the build however it ends. efi.img is written with mtools,
+# without a loop device.
 
 set -euo pipefail
 
-VERSION="26.01"
-CODENAME="noble"
+if [[ "${KARMAOS_BUILD_NAMESPACE:-}" != "1" ]]; then
+    # Back to the invoking user inside the namespace; sudo still works from there
+    exec sudo -E unshare --mount --propagation private -- \
+        sudo -E -u "$(id -un)" env KARMAOS_BUILD_NAMESPACE=1 PATH="${PATH}" bash "$0" "$@"
+fi
+
+VERSION="${KARMAOS_VERSION:-26.01}"
+CODENAME="${KARMAOS_CODENAME:-noble}"
+# The boot assembly (isolinux, grub-efi-amd64, shim) is amd64 only
 ARCH="amd64"
+FLAVORS="${KARMAOS_FLAVORS:-default}"
+
+SOURCE_DIR="$(pwd)"
+BUILD_ROOT="$(pwd)/build"
+BUILD_ID="$(date +%Y%m%d-%H%M%S)-$$"
+BUILD_DIR="${BUILD_ROOT}/${BUILD_ID}"
+OUTPUT_DIR="$(realpath -m "${KARMAOS_OUTPUT_DIR:-dist}")"
+KEEP_BUILD="${KARMAOS_KEEP_BUILD:-0}"
+CACHE_DIR="${KARMAOS_CACHE_DIR:-$(pwd)/cache}"
+BASE_MAX_AGE_DAYS="${KARMAOS_BASE_MAX_AGE_DAYS:-7}"
+
+# Fast build mode (opt-in): dpkg without fsync, chroot staged on tmpfs when RAM allows
+FAST_BUILD="${KARMAOS_FAST_BUILD:-0}"
+TMPFS_MIN_GIB="${KARMAOS_TMPFS_MIN_GIB:-20}"
+UNSAFE_IO_CONF="etc/dpkg/dpkg.cfg.d/karmaos-build-unsafe-io"
+BUILD_MODE=normal
+if [[ "${FAST_BUILD}" == "1" ]]; then
+    BUILD_MODE=fast
+fi
 
-BUILD_DIR="$(pwd)/build"
-OUTPUT_DIR="$(pwd)/dist"
-CHROOT_DIR="${BUILD_DIR}/chroot"
-ISO_DIR="${BUILD_DIR}/iso"
+# Stage timing: "<stage>\t<seconds>" lines in
+# dist/build-times.<mode>.base-<hit|miss>.tsv, named once the base cache is known
+TIMES_TMP="${OUTPUT_DIR}/build-times.${BUILD_MODE}.tmp"
+STAGE_NAME=""
+STAGE_START=0
+# stage <name>: close the running stage and start timing the next one
+stage() {
+    local now
+    now=$(date +%s)
+    if [[ -n "${STAGE_NAME}" ]]; then
+        printf '%s\t%d\n' "${STAGE_NAME}" $((now - STAGE_START)) >> "${TIMES_TMP}"
+    fi
+    STAGE_NAME="$1"
+    STAGE_START=${now}
+}
 
-echo "=============================================="
-echo "  KarmaOS ${VERSION} ISO Builder"
-echo "  Base: Ubuntu ${CODENAME} (24.04 LTS)"
-echo "  Architecture: ${ARCH}"
-echo "=============================================="
+# load_flavor <name>: set the FLAVOR_* variables from scripts/flavors/<name>.conf
+load_flavor() {
+    local file="${SOURCE_DIR}/scripts/flavors/$1.conf"
+    if [[ ! -f "${file}" ]]; then
+        echo "ERROR: unknown flavor '$1' (no ${file})"
+        exit 1
+    fi
+    FLAVOR_NAME="$1"
+    FLAVOR_PRODUCT="KarmaOS"
+    FLAVOR_SUFFIX=""
+    FLAVOR_PACKAGES_ADD=""
+    FLAVOR_PACKAGES_REMOVE=""
+    FLAVOR_SQUASHFS_COMP="-comp xz -Xbcj x86"
+    FLAVOR_SQUASHFS_BLOCK="1M"
+    FLAVOR_KERNEL_ARGS="quiet splash"
+    FLAVOR_SIZE_BUDGET="scripts/image-budget.conf"
+    # shellcheck disable=SC1090
+    source "${file}"
+}
 
-# Install dependencies
-echo "==> Installing build dependencies..."
-sudo apt-get update
-sudo apt-get install -y \
-    debootstrap \
-    squashfs-tools \
-    xorriso \
-    isolinux \
-    syslinux-utils \
-    grub-pc-bin \
-    grub-efi-amd64-bin \
-    grub-efi-amd64-signed \
-    shim-signed \
-    mtools \
-    dosfstools
+mount_chroot() {
+    sudo mount --bind /dev "$1/dev"
+    sudo mount --bind /dev/pts "$1/dev/pts"
+    sudo mount --bind /proc "$1/proc"
+    sudo mount --bind /sys "$1/sys"
+    sudo mount --bind /run "$1/run" || true
+}
 
-# Clean previous builds
-echo "==> Cleaning previous builds..."
-sudo rm -rf "${BUILD_DIR}"
-mkdir -p "${BUILD_DIR}" "${OUTPUT_DIR}" "${CHROOT_DIR}" "${ISO_DIR}"
+umount_chroot() {
+    sudo umount "$1/sys" || true
+    sudo umount "$1/proc" || true
+    sudo umount "$1/dev/pts" || true
+    sudo umount "$1/dev" || true
+    sudo umount "$1/run" || true
+}
 
-# ============================================
-# STEP 1: Bootstrap Ubuntu base system
-# ============================================
-echo "==> Bootstrapping Ubuntu ${CODENAME} base system..."
-sudo debootstrap --arch=${ARCH} ${CODENAME} "${CHROOT_DIR}" http://archive.ubuntu.com/ubuntu
+# Fast mode: dpkg skips fsync while unpacking. Always removed again before the
+# tree is cached or sealed, and checked for before mksquashfs.
+enable_unsafe_io() {
+    if [[ "${FAST_BUILD}" == "1" ]]; then
+        echo "force-unsafe-io" | sudo tee "$1/${UNSAFE_IO_CONF}" > /dev/null
+    fi
+}
+
+disable_unsafe_io() {
+    sudo rm -f "$1/${UNSAFE_IO_CONF}"
+}
+
+# Unmount this build's mounts (only visible in its namespace) and drop its tree.
+# Unmounting first matters: removing a mounted overlay would write through it.
+cleanup() {
+    local mnt
+    for mnt in $(awk -v b="${BUILD_DIR}/" -v c="${CACHE_DIR}/" \
+            'index($2, b) == 1 || index($2, c) == 1 {print $2}' /proc/mounts | sort -r); do
+        sudo umount -l "${mnt}" 2>/dev/null || true
+    done
+    if mountpoint -q "${BUILD_DIR}"; then
+        sudo umount -l "${BUILD_DIR}" 2>/dev/null || true
+    fi
+    if [[ "${KEEP_BUILD}" != "1" ]]; then
+        sudo rm -rf --one-file-system "${BUILD_DIR}"
+        rm -f "${BUILD_DIR}.lock"
+    fi
+}
+trap cleanup EXIT
+
+# remove_tree <dir>: delete a tree left by a dead build. Its chroot binds of the
+# host's /dev, /proc, /sys and /run are inherited by this namespace: unmount
+# them first and never cross into another filesystem, so rm cannot reach the
+# host's nodes. Refuses (status 1) while anything is still mounted below dir.
+remove_tree() {
+    local dir="$1" mnt
+    for mnt in $(awk -v d="${dir}/" 'index($2, d) == 1 {print $2}' /proc/mounts | sort -r); do
+        sudo umount -l "${mnt}" 2>/dev/null || true
+    done
+    if awk -v d="${dir}/" 'index($2, d) == 1 {found = 1} END {exit !found}' /proc/mounts; then
+        echo "WARNING: ${dir} still holds mounts, not removing it"
+        return 1
+    fi
+    sudo rm -rf --one-file-system "${dir}"
+}
+
+# Remove trees of builds that died without cleaning up (including the single
+# build/chroot of older versions of this script). A running build holds the
+# lock on build/<id>.lock from before its tree exists.
+prune_stale_builds() {
+    local dir
+    for dir in "${BUILD_ROOT}"/*/; do
+        dir="${dir%/}"
+        if [[ ! -d "${dir}" || "${dir}" == "${BUILD_DIR}" ]]; then
+            continue
+        fi
+        if flock -n "${dir}.lock" true; then
+            echo "==> Removing stale build tree $(basename "${dir}")"
+            if remove_tree "${dir}"; then
+                rm -f "${dir}.lock"
+            fi
+        fi
+    done
+}
+
+# base_is_fresh: the cached base is complete and younger than BASE_MAX_AGE_DAYS
+base_is_fresh() {
+    [[ -f "${BASE_DIR}/.complete" ]] && \
+        [[ -z "$(find "${BASE_DIR}/.complete" -mtime "+${BASE_MAX_AGE_DAYS}")" ]]
+}
+
+# Older bases can only be reused by an older script: drop those no build reads
+prune_old_bases() {
+    local dir
+    for dir in "${CACHE_DIR}"/base-*/; do
+        dir="${dir%/}"
+        if [[ ! -d "${dir}" || "${dir}" == "${BASE_DIR}" ]]; then
+            continue
+        fi
+        if flock -n -x "${dir}.lock" true; then
+            echo "==> Removing old base chroot $(basename "${dir}")"
+            if remove_tree "${dir}"; then
+                rm -f "${dir}.lock"
+            fi
+        fi
+    done
+}
 
 # ============================================
-# STEP 2: Configure chroot
+# Base chroot: everything the flavors share
 # ============================================
-echo "==> Configuring chroot environment..."
-
-# Mount necessary filesystems
-sudo mount --bind /dev "${CHROOT_DIR}/dev"
-sudo mount --bind /dev/pts "${CHROOT_DIR}/dev/pts"
-sudo mount --bind /proc "${CHROOT_DIR}/proc"
-sudo mount --bind /sys "${CHROOT_DIR}/sys"
-sudo mount --bind /run "${CHROOT_DIR}/run" || true
-# Ensure chroot has a real resolv.conf (avoid symlinks resolving to host)
-sudo rm -f "${CHROOT_DIR}/etc/resolv.conf"
-sudo cp /etc/resolv.conf "${CHROOT_DIR}/etc/resolv.conf"
-
-# Configure APT sources
-sudo tee "${CHROOT_DIR}/etc/apt/sources.list" > /dev/null <<EOF
+build_base() {
+    local CHROOT_DIR="$1"
+
+    # ============================================
+    # STEP 1: Bootstrap Ubuntu base system
+    # ============================================
+    echo "==> Bootstrapping Ubuntu ${CODENAME} base system..."
+    sudo debootstrap --arch=${ARCH} ${CODENAME} "${CHROOT_DIR}" http://archive.ubuntu.com/ubuntu
+    enable_unsafe_io "${CHROOT_DIR}"
+
+    # ============================================
+    # STEP 2: Configure chroot
+    # ============================================
+    echo "==> Configuring chroot environment..."
+    mount_chroot "${CHROOT_DIR}"
+    # Ensure chroot has a real resolv.conf (avoid symlinks resolving to host)
+    sudo rm -f "${CHROOT_DIR}/etc/resolv.conf"
+    sudo cp /etc/resolv.conf "${CHROOT_DIR}/etc/resolv.conf"
+
+    # Configure APT sources
+    sudo tee "${CHROOT_DIR}/etc/apt/sources.list" > /dev/null <<EOF
 deb http://archive.ubuntu.com/ubuntu ${CODENAME} main restricted universe multiverse
 deb http://archive.ubuntu.com/ubuntu ${CODENAME}-updates main restricted universe multiverse
 deb http://archive.ubuntu.com/ubuntu ${CODENAME}-security main restricted universe multiverse
 EOF
 
-# Set hostname
-echo "karmaos" | sudo tee "${CHROOT_DIR}/etc/hostname" > /dev/null
+    # Set hostname
+    echo "karmaos" | sudo tee "${CHROOT_DIR}/etc/hostname" > /dev/null
 
-# Configure hosts
-sudo tee "${CHROOT_DIR}/etc/hosts" > /dev/null <<EOF
+    # Configure hosts
+    sudo tee "${CHROOT_DIR}/etc/hosts" > /dev/null <<EOF
 127.0.0.1   localhost
 127.0.1.1   karmaos
 
@@ -81,12 +239,12 @@ ff02::1 ip6-allnodes
 ff02::2 ip6-allrouters
 EOF
 
-# ============================================
-# STEP 3: Install packages in chroot
-# ============================================
-echo "==> Installing packages (this takes 10-20 minutes)..."
+    # ============================================
+    # STEP 3: Install packages in chroot
+    # ============================================
+    echo "==> Installing packages (this takes 10-20 minutes)..."
 
-sudo chroot "${CHROOT_DIR}" /bin/bash -euxo pipefail -c '
+    sudo chroot "${CHROOT_DIR}" /bin/bash -euxo pipefail -c '
 export DEBIAN_FRONTEND=noninteractive
 
 echo "==> Initial apt update"
@@ -193,6 +351,9 @@ apt-get install -y --no-install-recommends \
     gir1.2-vte-2.91 \
     x11-xkb-utils
 
+# First-boot tuning (zram profile applied by karmaos-tuning)
+apt-get install -y --no-install-recommends systemd-zram-generator
+
 # WebKit for web view (try modern version first, fallback to older if needed)
 apt-get install -y --no-install-recommends gir1.2-webkit-6.0 || \
 apt-get install -y --no-install-recommends gir1.2-webkit2-4.1 || \
@@ -242,33 +403,82 @@ AUTOLOGIN
 systemctl enable sddm NetworkManager
 '
 
-echo "==> Installing KarmaOS branding + tools into chroot..."
+    sudo chroot "${CHROOT_DIR}" apt-get clean
+    disable_unsafe_io "${CHROOT_DIR}"
+    sudo rm -rf "${CHROOT_DIR}/var/lib/apt/lists/"*
+    sudo rm -rf "${CHROOT_DIR}/tmp"/*
+    umount_chroot "${CHROOT_DIR}"
+}
+
+# ============================================
+# Flavor layer: package delta, KarmaOS files and branding
+# ============================================
+customize_flavor() {
+    local CHROOT_DIR="$1"
+
+    enable_unsafe_io "${CHROOT_DIR}"
+    mount_chroot "${CHROOT_DIR}"
+    sudo rm -f "${CHROOT_DIR}/etc/resolv.conf"
+    sudo cp /etc/resolv.conf "${CHROOT_DIR}/etc/resolv.conf"
+
+    if [[ -n "${FLAVOR_PACKAGES_ADD}${FLAVOR_PACKAGES_REMOVE}" ]]; then
+        echo "==> Applying ${FLAVOR_NAME} package delta..."
+        sudo chroot "${CHROOT_DIR}" /bin/bash -euxo pipefail -c '
+export DEBIAN_FRONTEND=noninteractive
+set -f  # package globs are for dpkg-query, not the shell
+apt-get update
+if [[ -n "$1" ]]; then
+    apt-get install -y --no-install-recommends $1
+fi
+if [[ -n "$2" ]]; then
+    # dpkg-query expands the globs (libreoffice*) against installed packages
+    remove=$({ dpkg-query -W -f="\${db:Status-Abbrev} \${Package}\n" $2 2>/dev/null || true; } \
+        | awk "\$1 == \"ii\" {print \$2}")
+    if [[ -n "${remove}" ]]; then
+        apt-get purge -y ${remove}
+        apt-get autoremove -y --purge
+    fi
+fi
+' flavor-delta "${FLAVOR_PACKAGES_ADD}" "${FLAVOR_PACKAGES_REMOVE}"
+    fi
 
-# Ensure NetworkManager manages interfaces (netplan)
-sudo install -d "${CHROOT_DIR}/etc/netplan"
-sudo tee "${CHROOT_DIR}/etc/netplan/01-network-manager-all.yaml" > /dev/null <<'EOF'
+    echo "==> Installing KarmaOS branding + tools into chroot..."
+
+    # Ensure NetworkManager manages interfaces (netplan)
+    sudo install -d "${CHROOT_DIR}/etc/netplan"
+    sudo tee "${CHROOT_DIR}/etc/netplan/01-network-manager-all.yaml" > /dev/null <<'EOF'
 network:
     version: 2
     renderer: NetworkManager
 EOF
 
-# Branding assets
-sudo install -d "${CHROOT_DIR}/usr/share/karmaos"
-sudo install -m 0644 "$(pwd)/images/KarmaOSBack.png" "${CHROOT_DIR}/usr/share/karmaos/KarmaOSBack.png"
-sudo install -m 0644 "$(pwd)/images/KarmaOSLogoPixel.png" "${CHROOT_DIR}/usr/share/karmaos/KarmaOSLogoPixel.png"
-
-# KarmaOS Welcome
-sudo install -d "${CHROOT_DIR}/usr/local/lib/karmaos-welcome"
-sudo install -m 0755 "$(pwd)/snaps/karmaos-welcome/src/karmaos-welcome-gui.py" "${CHROOT_DIR}/usr/local/lib/karmaos-welcome/karmaos-welcome-gui.py"
-sudo tee "${CHROOT_DIR}/usr/local/bin/karmaos-welcome" > /dev/null <<'EOF'
+    # Branding assets
+    sudo install -d "${CHROOT_DIR}/usr/share/karmaos"
+    sudo install -m 0644 "$(pwd)/images/KarmaOSBack.png" "${CHROOT_DIR}/usr/share/karmaos/KarmaOSBack.png"
+    sudo install -m 0644 "$(pwd)/images/KarmaOSLogoPixel.png" "${CHROOT_DIR}/usr/share/karmaos/KarmaOSLogoPixel.png"
+    sudo install -m 0644 "$(pwd)/snaps/karmaos-welcome/assets/karmaos-welcome.html" "${CHROOT_DIR}/usr/share/karmaos/karmaos-welcome.html"
+
+    # KarmaOS Welcome
+    sudo install -d "${CHROOT_DIR}/usr/local/lib/karmaos-welcome"
+    sudo install -m 0755 "$(pwd)/snaps/karmaos-welcome/src/karmaos-welcome-gui.py" "${CHROOT_DIR}/usr/local/lib/karmaos-welcome/karmaos-welcome-gui.py"
+    for module in "$(pwd)"/snaps/karmaos-welcome/src/karmaos_*.py; do
+        sudo install -m 0644 "${module}" "${CHROOT_DIR}/usr/local/lib/karmaos-welcome/$(basename "${module}")"
+    done
+    sudo tee "${CHROOT_DIR}/usr/local/bin/karmaos-welcome" > /dev/null <<'EOF'
 #!/usr/bin/env bash
 exec /usr/bin/env python3 /usr/local/lib/karmaos-welcome/karmaos-welcome-gui.py
 EOF
-sudo chmod +x "${CHROOT_DIR}/usr/local/bin/karmaos-welcome"
+    sudo chmod +x "${CHROOT_DIR}/usr/local/bin/karmaos-welcome"
+    sudo tee "${CHROOT_DIR}/usr/local/bin/karmaos-tuning" > /dev/null <<'EOF'
+#!/usr/bin/env bash
+# Inspect, apply or revert the first-boot performance tuning
+exec /usr/bin/env python3 /usr/local/lib/karmaos-welcome/karmaos_tuning.py "$@"
+EOF
+    sudo chmod +x "${CHROOT_DIR}/usr/local/bin/karmaos-tuning"
 
-# Autostart: apply wallpaper + open KarmaOS-Welcome
-sudo install -d "${CHROOT_DIR}/usr/local/bin"
-sudo tee "${CHROOT_DIR}/usr/local/bin/karmaos-apply-branding" > /dev/null <<'EOF'
+    # Autostart: apply wallpaper + open KarmaOS-Welcome
+    sudo install -d "${CHROOT_DIR}/usr/local/bin"
+    sudo tee "${CHROOT_DIR}/usr/local/bin/karmaos-apply-branding" > /dev/null <<'EOF'
 #!/usr/bin/env bash
 set -euo pipefail
 
@@ -291,10 +501,10 @@ for (i=0; i<allDesktops.length; i++) {
 }
 " || true
 EOF
-sudo chmod +x "${CHROOT_DIR}/usr/local/bin/karmaos-apply-branding"
+    sudo chmod +x "${CHROOT_DIR}/usr/local/bin/karmaos-apply-branding"
 
-sudo install -d "${CHROOT_DIR}/etc/xdg/autostart"
-sudo tee "${CHROOT_DIR}/etc/xdg/autostart/karmaos-branding.desktop" > /dev/null <<'EOF'
+    sudo install -d "${CHROOT_DIR}/etc/xdg/autostart"
+    sudo tee "${CHROOT_DIR}/etc/xdg/autostart/karmaos-branding.desktop" > /dev/null <<'EOF'
 [Desktop Entry]
 Type=Application
 Name=KarmaOS Branding
@@ -303,7 +513,7 @@ X-GNOME-Autostart-enabled=true
 NoDisplay=true
 EOF
 
-sudo tee "${CHROOT_DIR}/etc/xdg/autostart/karmaos-welcome.desktop" > /dev/null <<'EOF'
+    sudo tee "${CHROOT_DIR}/etc/xdg/autostart/karmaos-welcome.desktop" > /dev/null <<'EOF'
 [Desktop Entry]
 Type=Application
 Name=KarmaOS Welcome
@@ -312,12 +522,12 @@ X-GNOME-Autostart-enabled=true
 NoDisplay=false
 EOF
 
-# Desktop shortcut: installer
-sudo install -d "${CHROOT_DIR}/home/ubuntu/Desktop"
+    # Desktop shortcut: installer
+    sudo install -d "${CHROOT_DIR}/home/ubuntu/Desktop"
 
-# Polkit rule: allow members of sudo group to run Calamares without password
-sudo install -d "${CHROOT_DIR}/etc/polkit-1/rules.d"
-sudo tee "${CHROOT_DIR}/etc/polkit-1/rules.d/49-nopasswd-calamares.rules" > /dev/null <<'EOF'
+    # Polkit rule: allow members of sudo group to run Calamares without password
+    sudo install -d "${CHROOT_DIR}/etc/polkit-1/rules.d"
+    sudo tee "${CHROOT_DIR}/etc/polkit-1/rules.d/49-nopasswd-calamares.rules" > /dev/null <<'EOF'
 /* Allow live user (in sudo group) to run Calamares without authentication */
 polkit.addRule(function(action, subject) {
     if ((action.id == "org.freedesktop.policykit.exec" ||
@@ -327,19 +537,37 @@ polkit.addRule(function(action, subject) {
     }
 });
 EOF
-sudo chmod 0644 "${CHROOT_DIR}/etc/polkit-1/rules.d/49-nopasswd-calamares.rules"
+    sudo chmod 0644 "${CHROOT_DIR}/etc/polkit-1/rules.d/49-nopasswd-calamares.rules"
+
+    # Polkit rule: let the live user hold/release snap refreshes from KarmaOS Welcome.
+    # Live session only: the installer removes both rules from the target
+    # (shellprocess.conf), where an account may well be called 'ubuntu' too.
+    sudo tee "${CHROOT_DIR}/etc/polkit-1/rules.d/48-karmaos-snapd.rules" > /dev/null <<'EOF'
+polkit.addRule(function(action, subject) {
+    if ((action.id == "io.snapcraft.snapd.manage-configuration" ||
+         action.id == "io.snapcraft.snapd.manage") &&
+        subject.user == "ubuntu") {
+        return polkit.Result.YES;
+    }
+});
+EOF
+    sudo chmod 0644 "${CHROOT_DIR}/etc/polkit-1/rules.d/48-karmaos-snapd.rules"
 
-# Wrapper that launches installer with privileges (direct sudo, no pkexec)
-sudo tee "${CHROOT_DIR}/usr/local/bin/karmaos-installer" > /dev/null <<'EOF'
+    # Wrapper that launches installer with privileges (direct sudo, no pkexec)
+    sudo tee "${CHROOT_DIR}/usr/local/bin/karmaos-installer" > /dev/null <<'EOF'
 #!/usr/bin/env bash
 set -e
 
 # In the live session, user 'ubuntu' has passwordless sudo.
+# Skip the Calamares checks that KarmaOS Welcome already passed (cached probe).
+sudo /usr/bin/env python3 /usr/local/lib/karmaos-welcome/karmaos_requirements.py \
+    --cache "${XDG_RUNTIME_DIR:-/tmp}/karmaos-requirements.json" --no-probe \
+    --calamares-conf /etc/calamares/modules/welcome.conf || true
 exec sudo -E calamares
 EOF
-sudo chmod +x "${CHROOT_DIR}/usr/local/bin/karmaos-installer"
+    sudo chmod +x "${CHROOT_DIR}/usr/local/bin/karmaos-installer"
 
-sudo tee "${CHROOT_DIR}/home/ubuntu/Desktop/Install KarmaOS.desktop" > /dev/null <<'EOF'
+    sudo tee "${CHROOT_DIR}/home/ubuntu/Desktop/Install KarmaOS.desktop" > /dev/null <<'EOF'
 [Desktop Entry]
 Type=Application
 Name=Install KarmaOS
@@ -349,20 +577,20 @@ Icon=system-software-install
 Terminal=false
 Categories=System;
 EOF
-sudo chmod +x "${CHROOT_DIR}/home/ubuntu/Desktop/Install KarmaOS.desktop"
-
-# Remove any stray installer launchers that might appear as "Install Debian"
-sudo rm -f \
-    "${CHROOT_DIR}/home/ubuntu/Desktop/Install Debian.desktop" \
-    "${CHROOT_DIR}/home/ubuntu/Desktop/Install%20Debian.desktop" \
-    "${CHROOT_DIR}/usr/share/applications/install-debian.desktop" \
-    "${CHROOT_DIR}/usr/share/applications/debian-installer.desktop" || true
-sudo chown -R 1000:1000 "${CHROOT_DIR}/home/ubuntu" || true
-
-# Basic distro branding
-sudo tee "${CHROOT_DIR}/etc/os-release" > /dev/null <<EOF
+    sudo chmod +x "${CHROOT_DIR}/home/ubuntu/Desktop/Install KarmaOS.desktop"
+
+    # Remove any stray installer launchers that might appear as "Install Debian"
+    sudo rm -f \
+        "${CHROOT_DIR}/home/ubuntu/Desktop/Install Debian.desktop" \
+        "${CHROOT_DIR}/home/ubuntu/Desktop/Install%20Debian.desktop" \
+        "${CHROOT_DIR}/usr/share/applications/install-debian.desktop" \
+        "${CHROOT_DIR}/usr/share/applications/debian-installer.desktop" || true
+    sudo chown -R 1000:1000 "${CHROOT_DIR}/home/ubuntu" || true
+
+    # Basic distro branding
+    sudo tee "${CHROOT_DIR}/etc/os-release" > /dev/null <<EOF
 NAME="KarmaOS"
-PRETTY_NAME="KarmaOS ${VERSION}"
+PRETTY_NAME="${FLAVOR_PRODUCT} ${VERSION}"
 ID=karmaos
 ID_LIKE=ubuntu
 VERSION_ID="${VERSION}"
@@ -372,11 +600,11 @@ SUPPORT_URL="https://github.com/aporler/KarmaOS/issues"
 BUG_REPORT_URL="https://github.com/aporler/KarmaOS/issues"
 EOF
 
-echo "==> Configuring Calamares..."
-sudo install -d "${CHROOT_DIR}/etc/calamares" "${CHROOT_DIR}/etc/calamares/modules" "${CHROOT_DIR}/etc/calamares/branding/karmaos"
+    echo "==> Configuring Calamares..."
+    sudo install -d "${CHROOT_DIR}/etc/calamares" "${CHROOT_DIR}/etc/calamares/modules" "${CHROOT_DIR}/etc/calamares/branding/karmaos"
 
-# Complete Calamares settings with all required keys
-sudo tee "${CHROOT_DIR}/etc/calamares/settings.conf" > /dev/null <<'EOF'
+    # Complete Calamares settings with all required keys
+    sudo tee "${CHROOT_DIR}/etc/calamares/settings.conf" > /dev/null <<'EOF'
 ---
 modules-search: [ local, /usr/lib/x86_64-linux-gnu/calamares/modules, /usr/lib/calamares/modules, /usr/share/calamares/modules ]
 
@@ -398,6 +626,7 @@ sequence:
       - localecfg
       - grubcfg
       - bootloader
+      - shellprocess
       - umount
   - show:
       - finished
@@ -414,17 +643,26 @@ hide-back-and-next-during-exec: false
 quit-at-end: false
 EOF
 
-# Unpack filesystem from the live media (casper squashfs)
-# Prefer Calamares' C++ module (unpackfsc) which uses unsquashfs for squashfs images.
-sudo tee "${CHROOT_DIR}/etc/calamares/modules/unpackfsc.conf" > /dev/null <<'EOF'
+    # Unpack filesystem from the live media (casper squashfs)
+    # Prefer Calamares' C++ module (unpackfsc) which uses unsquashfs for squashfs images.
+    sudo tee "${CHROOT_DIR}/etc/calamares/modules/unpackfsc.conf" > /dev/null <<'EOF'
 ---
 source: "/cdrom/casper/filesystem.squashfs"
 sourcefs: "squashfs"
 destination: "/"
 EOF
 
-# Users module - create user account
-sudo tee "${CHROOT_DIR}/etc/calamares/modules/users.conf" > /dev/null <<'EOF'
+    # Drop the live-session-only polkit rules from the installed system
+    sudo tee "${CHROOT_DIR}/etc/calamares/modules/shellprocess.conf" > /dev/null <<'EOF'
+---
+dontChroot: false
+timeout: 30
+script:
+    - "rm -f /etc/polkit-1/rules.d/48-karmaos-snapd.rules /etc/polkit-1/rules.d/49-nopasswd-calamares.rules"
+EOF
+
+    # Users module - create user account
+    sudo tee "${CHROOT_DIR}/etc/calamares/modules/users.conf" > /dev/null <<'EOF'
 ---
 defaultGroups:
   - sudo
@@ -440,8 +678,8 @@ setRootPassword: false
 doAutologin: false
 EOF
 
-# Partition module
-sudo tee "${CHROOT_DIR}/etc/calamares/modules/partition.conf" > /dev/null <<'EOF'
+    # Partition module
+    sudo tee "${CHROOT_DIR}/etc/calamares/modules/partition.conf" > /dev/null <<'EOF'
 ---
 efiSystemPartition: "/boot/efi"
 userSwapChoices:
@@ -456,14 +694,14 @@ enableLuksAutomatedPartitioning: true
 allowManualPartitioning: true
 EOF
 
-# Mount module
-sudo tee "${CHROOT_DIR}/etc/calamares/modules/mount.conf" > /dev/null <<'EOF'
+    # Mount module
+    sudo tee "${CHROOT_DIR}/etc/calamares/modules/mount.conf" > /dev/null <<'EOF'
 ---
 # Use Calamares defaults; pre-binding /dev,/run,/proc,/sys can break unpackfs/rsync.
 EOF
 
-# Bootloader module
-sudo tee "${CHROOT_DIR}/etc/calamares/modules/bootloader.conf" > /dev/null <<'EOF'
+    # Bootloader module
+    sudo tee "${CHROOT_DIR}/etc/calamares/modules/bootloader.conf" > /dev/null <<'EOF'
 ---
 efiBootLoader: "grub"
 kernel: "/vmlinuz"
@@ -475,50 +713,34 @@ grubCfg: "/boot/grub/grub.cfg"
 efiBootloaderId: "KarmaOS"
 EOF
 
-# Locale module
-sudo tee "${CHROOT_DIR}/etc/calamares/modules/locale.conf" > /dev/null <<'EOF'
+    # Locale module
+    sudo tee "${CHROOT_DIR}/etc/calamares/modules/locale.conf" > /dev/null <<'EOF'
 ---
 region: "America"
 zone: "Montreal"
 localeGenPath: "/etc/locale.gen"
 EOF
 
-# Keyboard module
-sudo tee "${CHROOT_DIR}/etc/calamares/modules/keyboard.conf" > /dev/null <<'EOF'
+    # Keyboard module
+    sudo tee "${CHROOT_DIR}/etc/calamares/modules/keyboard.conf" > /dev/null <<'EOF'
 ---
 xOrgConfFileName: "/etc/X11/xorg.conf.d/00-keyboard.conf"
 convertedKeymapPath: "/lib/kbd/keymaps/xkb"
 EOF
 
-# Welcome module
-sudo tee "${CHROOT_DIR}/etc/calamares/modules/welcome.conf" > /dev/null <<'EOF'
----
-showSupportUrl: true
-showKnownIssuesUrl: false
-showReleaseNotesUrl: false
-requirements:
-  requiredStorage: 10.0
-  requiredRam: 1.0
-  internetCheckUrl: http://google.com
-  check:
-    - storage
-    - ram
-    - power
-    - internet
-    - root
-  required:
-    - storage
-    - ram
-    - root
-EOF
+    # Welcome module: generated by the wizard's requirements probe so both share
+    # the same thresholds; karmaos-installer regenerates it from the cached probe
+    python3 "$(pwd)/snaps/karmaos-welcome/src/karmaos_requirements.py" \
+        --cache /dev/null --no-probe --calamares-conf - \
+        | sudo tee "${CHROOT_DIR}/etc/calamares/modules/welcome.conf" > /dev/null
 
-# Summary module
-sudo tee "${CHROOT_DIR}/etc/calamares/modules/summary.conf" > /dev/null <<'EOF'
+    # Summary module
+    sudo tee "${CHROOT_DIR}/etc/calamares/modules/summary.conf" > /dev/null <<'EOF'
 ---
 EOF
 
-# Slideshow QML - MUST be in branding folder, not modules
-sudo tee "${CHROOT_DIR}/etc/calamares/branding/karmaos/show.qml" > /dev/null <<'EOF'
+    # Slideshow QML - MUST be in branding folder, not modules
+    sudo tee "${CHROOT_DIR}/etc/calamares/branding/karmaos/show.qml" > /dev/null <<'EOF'
 import QtQuick 2.0
 import calamares.slideshow 1.0
 
@@ -529,26 +751,26 @@ Presentation {
 }
 EOF
 
-# Hide reboot checkbox/button on the finish page (avoid "Finish & Reboot")
-sudo tee "${CHROOT_DIR}/etc/calamares/modules/finished.conf" > /dev/null <<'EOF'
+    # Hide reboot checkbox/button on the finish page (avoid "Finish & Reboot")
+    sudo tee "${CHROOT_DIR}/etc/calamares/modules/finished.conf" > /dev/null <<'EOF'
 ---
 restartNowEnabled: false
 restartNowChecked: false
 restartNowCommand: "systemctl reboot"
 EOF
 
-# Complete Calamares branding with all required fields
-sudo tee "${CHROOT_DIR}/etc/calamares/branding/karmaos/branding.desc" > /dev/null <<EOF
+    # Complete Calamares branding with all required fields
+    sudo tee "${CHROOT_DIR}/etc/calamares/branding/karmaos/branding.desc" > /dev/null <<EOF
 ---
 componentName: karmaos
 
 strings:
-  productName: KarmaOS ${VERSION}
+  productName: ${FLAVOR_PRODUCT} ${VERSION}
   shortProductName: KarmaOS
   version: ${VERSION}
   shortVersion: ${VERSION}
-  versionedName: KarmaOS ${VERSION}
-  shortVersionedName: KarmaOS ${VERSION}
+  versionedName: ${FLAVOR_PRODUCT} ${VERSION}
+  shortVersionedName: ${FLAVOR_PRODUCT} ${VERSION}
   bootloaderEntryName: KarmaOS
   productUrl: https://github.com/aporler/KarmaOS
   supportUrl: https://github.com/aporler/KarmaOS/issues
@@ -579,99 +801,135 @@ sidebar: widget
 navigation: widget
 EOF
 
-# Clean up apt cache and tmp outside chroot
-sudo chroot "${CHROOT_DIR}" apt-get clean
-sudo rm -rf "${CHROOT_DIR}/var/lib/apt/lists/"*
-sudo rm -rf "${CHROOT_DIR}/tmp"/*
+    # Clean up apt cache and tmp outside chroot
+    sudo chroot "${CHROOT_DIR}" apt-get clean
+    disable_unsafe_io "${CHROOT_DIR}"
+    sudo rm -rf "${CHROOT_DIR}/var/lib/apt/lists/"*
+    sudo rm -rf "${CHROOT_DIR}/tmp"/*
 
-# Unmount chroot filesystems
-sudo umount "${CHROOT_DIR}/sys" || true
-sudo umount "${CHROOT_DIR}/proc" || true
-sudo umount "${CHROOT_DIR}/dev/pts" || true
-sudo umount "${CHROOT_DIR}/dev" || true
-sudo umount "${CHROOT_DIR}/run" || true
+    # Unmount chroot filesystems
+    umount_chroot "${CHROOT_DIR}"
+}
 
 # ============================================
-# STEP 4: Create ISO structure
+# Flavor assembly: squashfs, bootloaders, ISO
 # ============================================
-echo "==> Creating ISO directory structure..."
-
-mkdir -p "${ISO_DIR}"/{casper,isolinux,boot/grub}
-
-# Generate manifest files expected by casper
-sudo chroot "${CHROOT_DIR}" dpkg-query -W --showformat='${Package} ${Version}\n' \
-    | sudo tee "${ISO_DIR}/casper/filesystem.manifest" > /dev/null
-sudo cp "${ISO_DIR}/casper/filesystem.manifest" "${ISO_DIR}/casper/filesystem.manifest-desktop"
-
-# Create squashfs filesystem
-echo "==> Creating squashfs (this takes 5-10 minutes)..."
-sudo mksquashfs "${CHROOT_DIR}" "${ISO_DIR}/casper/filesystem.squashfs" \
-    -comp xz -Xbcj x86 -b 1M -no-duplicates
-
-# Calculate filesystem size
-printf $(sudo du -sx --block-size=1 "${CHROOT_DIR}" | cut -f1) | sudo tee "${ISO_DIR}/casper/filesystem.size" > /dev/null
-
-KERNEL=$(find "${CHROOT_DIR}/boot" -maxdepth 1 -type f -name "vmlinuz-*" | sort | tail -n1)
-INITRD=$(find "${CHROOT_DIR}/boot" -maxdepth 1 -type f -name "initrd.img-*" | sort | tail -n1)
+assemble_flavor() {
+    local CHROOT_DIR="$1"
+    local ISO_DIR="$2"
+    STAGE_NAME=""
+
+    # ============================================
+    # STEP 4: Create ISO structure
+    # ============================================
+    echo "==> Creating ISO directory structure..."
+
+    mkdir -p "${ISO_DIR}"/{casper,isolinux,boot/grub}
+
+    # Generate manifest files expected by casper
+    sudo chroot "${CHROOT_DIR}" dpkg-query -W --showformat='${Package} ${Version}\n' \
+        | sudo tee "${ISO_DIR}/casper/filesystem.manifest" > /dev/null
+    sudo cp "${ISO_DIR}/casper/filesystem.manifest" "${ISO_DIR}/casper/filesystem.manifest-desktop"
+
+    # The fast-mode dpkg setting must never ship in the image
+    if sudo grep -rqs 'unsafe-io' "${CHROOT_DIR}/etc/dpkg/dpkg.cfg" "${CHROOT_DIR}/etc/dpkg/dpkg.cfg.d"; then
+        echo "ERROR: dpkg force-unsafe-io is still configured in the chroot"
+        exit 1
+    fi
 
-if [[ -z "${KERNEL}" || -z "${INITRD}" ]]; then
-    echo "ERROR: Kernel or initrd not found in chroot /boot"
-    sudo ls -lah "${CHROOT_DIR}/boot" || true
-    exit 1
-fi
+    # Create squashfs filesystem (flavors share the CPUs)
+    stage "squashfs:${FLAVOR_NAME}"
+    echo "==> Creating squashfs (this takes 5-10 minutes)..."
+    # shellcheck disable=SC2086
+    sudo mksquashfs "${CHROOT_DIR}" "${ISO_DIR}/casper/filesystem.squashfs" \
+        ${FLAVOR_SQUASHFS_COMP} -b "${FLAVOR_SQUASHFS_BLOCK}" -no-duplicates \
+        -processors "${SQUASHFS_PROCESSORS}" -no-progress
+
+    # Size report: per-package and per-directory attribution, diff against the
+    # last successful build (.prev.json), and the flavor's budget
+    # (scripts/image-budget.conf)
+    stage "size-report:${FLAVOR_NAME}"
+    echo "==> Analysing image size..."
+    local report="${OUTPUT_DIR}/size-report${FLAVOR_SUFFIX}"
+    local budget=()
+    if [[ -n "${FLAVOR_SIZE_BUDGET}" ]]; then
+        budget=(--budget "${SOURCE_DIR}/${FLAVOR_SIZE_BUDGET}")
+    fi
+    sudo python3 "${SOURCE_DIR}/scripts/image-size-report.py" "${CHROOT_DIR}" \
+        --squashfs "${ISO_DIR}/casper/filesystem.squashfs" \
+        --previous "${report}.prev.json" \
+        --block-size "${FLAVOR_SQUASHFS_BLOCK}" \
+        "${budget[@]}" \
+        --output "${report}.json" \
+        | tee "${report}.txt"
+    sudo chown "$(id -u):$(id -g)" "${report}.json"
+
+    # Calculate filesystem size
+    printf $(sudo du -sx --block-size=1 "${CHROOT_DIR}" | cut -f1) | sudo tee "${ISO_DIR}/casper/filesystem.size" > /dev/null
+
+    local KERNEL INITRD
+    KERNEL=$(find "${CHROOT_DIR}/boot" -maxdepth 1 -type f -name "vmlinuz-*" | sort | tail -n1)
+    INITRD=$(find "${CHROOT_DIR}/boot" -maxdepth 1 -type f -name "initrd.img-*" | sort | tail -n1)
+
+    if [[ -z "${KERNEL}" || -z "${INITRD}" ]]; then
+        echo "ERROR: Kernel or initrd not found in chroot /boot"
+        sudo ls -lah "${CHROOT_DIR}/boot" || true
+        exit 1
+    fi
 
-sudo cp "${KERNEL}" "${ISO_DIR}/casper/vmlinuz"
-sudo cp "${INITRD}" "${ISO_DIR}/casper/initrd"
+    sudo cp "${KERNEL}" "${ISO_DIR}/casper/vmlinuz"
+    sudo cp "${INITRD}" "${ISO_DIR}/casper/initrd"
 
-# ============================================
-# STEP 5: Configure ISOLINUX (BIOS boot)
-# ============================================
-echo "==> Configuring ISOLINUX for BIOS boot..."
+    # ============================================
+    # STEP 5: Configure ISOLINUX (BIOS boot)
+    # ============================================
+    stage "bootloaders:${FLAVOR_NAME}"
+    echo "==> Configuring ISOLINUX for BIOS boot..."
 
-# Copy ISOLINUX files
-sudo cp /usr/lib/ISOLINUX/isolinux.bin "${ISO_DIR}/isolinux/"
-sudo cp /usr/lib/syslinux/modules/bios/*.c32 "${ISO_DIR}/isolinux/"
+    # Copy ISOLINUX files
+    sudo cp /usr/lib/ISOLINUX/isolinux.bin "${ISO_DIR}/isolinux/"
+    sudo cp /usr/lib/syslinux/modules/bios/*.c32 "${ISO_DIR}/isolinux/"
 
-# Create ISOLINUX config
-sudo tee "${ISO_DIR}/isolinux/isolinux.cfg" > /dev/null <<EOF
+    # Create ISOLINUX config
+    sudo tee "${ISO_DIR}/isolinux/isolinux.cfg" > /dev/null <<EOF
 UI vesamenu.c32
 TIMEOUT 50
 PROMPT 0
 DEFAULT live
 
-MENU TITLE KarmaOS ${VERSION} Boot Menu
+MENU TITLE ${FLAVOR_PRODUCT} ${VERSION} Boot Menu
 MENU COLOR border       30;44   #40ffffff #a0000000 std
 MENU COLOR title        1;36;44 #9033ccff #a0000000 std
 MENU COLOR sel          7;37;40 #e0ffffff #20ffffff all
 MENU COLOR unsel        37;44   #50ffffff #a0000000 std
 
 LABEL live
-    MENU LABEL Start KarmaOS ${VERSION} (Live)
+    MENU LABEL Start ${FLAVOR_PRODUCT} ${VERSION} (Live)
     KERNEL /casper/vmlinuz
-    APPEND initrd=/casper/initrd boot=casper quiet splash ---
+    APPEND initrd=/casper/initrd boot=casper ${FLAVOR_KERNEL_ARGS} ---
 
 LABEL hd
     MENU LABEL Boot from Hard Disk
     LOCALBOOT 0x80
 EOF
 
-# ============================================
-# STEP 6: Configure GRUB (UEFI boot)
-# ============================================
-echo "==> Configuring GRUB for UEFI boot..."
+    # ============================================
+    # STEP 6: Configure GRUB (UEFI boot)
+    # ============================================
+    echo "==> Configuring GRUB for UEFI boot..."
 
-# Create GRUB config
-sudo tee "${ISO_DIR}/boot/grub/grub.cfg" > /dev/null <<EOF
+    # Create GRUB config
+    sudo tee "${ISO_DIR}/boot/grub/grub.cfg" > /dev/null <<EOF
 set timeout=5
 set default=0
 
-menuentry "Start KarmaOS ${VERSION}" {
-    linux /casper/vmlinuz boot=casper quiet splash ---
+menuentry "Start ${FLAVOR_PRODUCT} ${VERSION}" {
+    linux /casper/vmlinuz boot=casper ${FLAVOR_KERNEL_ARGS} ---
     initrd /casper/initrd
 }
 
-menuentry "Start KarmaOS (Safe Mode)" {
-    linux /casper/vmlinuz boot=casper xforcevesa nomodeset quiet splash ---
+menuentry "Start ${FLAVOR_PRODUCT} (Safe Mode)" {
+    linux /casper/vmlinuz boot=casper xforcevesa nomodeset ${FLAVOR_KERNEL_ARGS} ---
     initrd /casper/initrd
 }
 
@@ -680,100 +938,279 @@ menuentry "Boot from Hard Disk" {
 }
 EOF
 
-# Create EFI boot image
-echo "==> Creating EFI boot image..."
-mkdir -p "${ISO_DIR}/EFI/BOOT" "${ISO_DIR}/EFI/ubuntu"
+    # Create EFI boot image
+    echo "==> Creating EFI boot image..."
+    mkdir -p "${ISO_DIR}/EFI/BOOT" "${ISO_DIR}/EFI/ubuntu"
+
+    # Create FAT image for EFI, populated with mtools (no loop device, no root)
+    local EFI_IMG="${ISO_DIR}/boot/grub/efi.img"
+    rm -f "${EFI_IMG}"
+    mkfs.vfat -C "${EFI_IMG}" 10240 > /dev/null
+    mmd -i "${EFI_IMG}" ::/EFI ::/EFI/BOOT ::/EFI/ubuntu ::/boot ::/boot/grub
+
+    # Copy EFI bootloader
+    if [ -f /usr/lib/shim/shimx64.efi.signed ]; then
+        mcopy -i "${EFI_IMG}" /usr/lib/shim/shimx64.efi.signed ::/EFI/BOOT/BOOTX64.EFI
+        mcopy -i "${EFI_IMG}" /usr/lib/grub/x86_64-efi-signed/grubx64.efi.signed ::/EFI/BOOT/GRUBX64.EFI
+    else
+        # Fallback: create GRUB EFI directly
+        local GRUB_EFI
+        GRUB_EFI=$(mktemp)
+        grub-mkimage -o "${GRUB_EFI}" \
+            -p /EFI/BOOT -O x86_64-efi \
+            fat iso9660 part_gpt part_msdos normal boot linux loopback chain \
+            efifwsetup efi_gop efi_uga ls search search_label search_fs_uuid \
+            search_fs_file gfxterm gfxterm_background gfxterm_menu test all_video \
+            loadenv exfat ext2 ntfs btrfs hfsplus udf
+        mcopy -i "${EFI_IMG}" "${GRUB_EFI}" ::/EFI/BOOT/BOOTX64.EFI
+        rm -f "${GRUB_EFI}"
+    fi
 
-# Create FAT image for EFI
-dd if=/dev/zero of="${ISO_DIR}/boot/grub/efi.img" bs=1M count=10
-mkfs.vfat "${ISO_DIR}/boot/grub/efi.img"
+    # Copy GRUB config to EFI, and to the other common UEFI locations
+    mcopy -i "${EFI_IMG}" "${ISO_DIR}/boot/grub/grub.cfg" ::/boot/grub/grub.cfg
+    mcopy -i "${EFI_IMG}" "${ISO_DIR}/boot/grub/grub.cfg" ::/EFI/BOOT/grub.cfg
+    mcopy -i "${EFI_IMG}" "${ISO_DIR}/boot/grub/grub.cfg" ::/EFI/ubuntu/grub.cfg
 
-# Mount and setup EFI image
-MOUNT_EFI=$(mktemp -d)
-sudo mount "${ISO_DIR}/boot/grub/efi.img" "${MOUNT_EFI}"
-sudo mkdir -p "${MOUNT_EFI}/EFI/BOOT" "${MOUNT_EFI}/EFI/ubuntu"
+    # Also copy to EFI/boot for direct boot
+    sudo cp /usr/lib/grub/x86_64-efi-signed/grubx64.efi.signed "${ISO_DIR}/EFI/BOOT/GRUBX64.EFI" 2>/dev/null || true
+    if [ -f /usr/lib/shim/shimx64.efi.signed ]; then
+        sudo cp /usr/lib/shim/shimx64.efi.signed "${ISO_DIR}/EFI/BOOT/BOOTX64.EFI"
+    fi
 
-# Copy EFI bootloader
-if [ -f /usr/lib/shim/shimx64.efi.signed ]; then
-    sudo cp /usr/lib/shim/shimx64.efi.signed "${MOUNT_EFI}/EFI/BOOT/BOOTX64.EFI"
-    sudo cp /usr/lib/grub/x86_64-efi-signed/grubx64.efi.signed "${MOUNT_EFI}/EFI/BOOT/GRUBX64.EFI"
-else
-    # Fallback: create GRUB EFI directly
-    sudo grub-mkimage -o "${MOUNT_EFI}/EFI/BOOT/BOOTX64.EFI" \
-        -p /EFI/BOOT -O x86_64-efi \
-        fat iso9660 part_gpt part_msdos normal boot linux loopback chain \
-        efifwsetup efi_gop efi_uga ls search search_label search_fs_uuid \
-        search_fs_file gfxterm gfxterm_background gfxterm_menu test all_video \
-        loadenv exfat ext2 ntfs btrfs hfsplus udf
-fi
+    # Also provide grub.cfg at EFI/boot for some UEFI implementations
+    sudo mkdir -p "${ISO_DIR}/EFI/BOOT" "${ISO_DIR}/EFI/ubuntu"
+    sudo cp "${ISO_DIR}/boot/grub/grub.cfg" "${ISO_DIR}/EFI/BOOT/grub.cfg" || true
+    sudo cp "${ISO_DIR}/boot/grub/grub.cfg" "${ISO_DIR}/EFI/ubuntu/grub.cfg" || true
+
+    # ============================================
+    # STEP 7: Create bootable ISO
+    # ============================================
+    stage "iso:${FLAVOR_NAME}"
+    echo "==> Creating bootable hybrid ISO..."
+
+    local FINAL_ISO="${OUTPUT_DIR}/karmaos-${VERSION}${FLAVOR_SUFFIX}-${ARCH}.iso"
+
+    echo "==> Fixing ISO tree permissions for xorriso..."
+    sudo chown -R "$(id -u):$(id -g)" "${ISO_DIR}"
+    sudo chmod -R a+rX "${ISO_DIR}"
+
+    local VOLID="KARMAOS_${VERSION//./_}${FLAVOR_SUFFIX//-/_}"
+    VOLID="${VOLID^^}"
+
+    xorriso -as mkisofs \
+        -iso-level 3 \
+        -full-iso9660-filenames \
+        -volid "${VOLID}" \
+        -output "${FINAL_ISO}" \
+        -eltorito-boot isolinux/isolinux.bin \
+            -no-emul-boot \
+            -boot-load-size 4 \
+            -boot-info-table \
+            -isohybrid-mbr /usr/lib/ISOLINUX/isohdpfx.bin \
+        -eltorito-alt-boot \
+            -e boot/grub/efi.img \
+            -no-emul-boot \
+            -isohybrid-gpt-basdat \
+        "${ISO_DIR}"
+
+    # Block checksums so testers can update from their previous ISO
+    # with scripts/karmaos-iso-update.sh and only download changed blocks
+    stage "zsync:${FLAVOR_NAME}"
+    echo "==> Generating zsync control file..."
+    (cd "${OUTPUT_DIR}" && zsyncmake -u "$(basename "${FINAL_ISO}")" \
+        -o "$(basename "${FINAL_ISO}").zsync" "$(basename "${FINAL_ISO}")")
+
+    # Only a complete build within budget becomes the next build's baseline;
+    # a failed one must not hide its growth from the rerun
+    cp -f "${report}.json" "${report}.prev.json"
+    stage ""
+}
+
+echo "=============================================="
+echo "  KarmaOS ${VERSION} ISO Builder"
+echo "  Base: Ubuntu ${CODENAME} (24.04 LTS)"
+echo "  Architecture: ${ARCH}"
+echo "  Flavors: ${FLAVORS}"
+echo "  Build mode: ${BUILD_MODE}"
+echo "=============================================="
 
-# Copy GRUB config to EFI
-sudo mkdir -p "${MOUNT_EFI}/boot/grub"
-sudo cp "${ISO_DIR}/boot/grub/grub.cfg" "${MOUNT_EFI}/boot/grub/"
+for flavor in ${FLAVORS}; do
+    ( load_flavor "${flavor}" )
+done
 
-# Also place grub.cfg at common UEFI locations
-sudo cp "${ISO_DIR}/boot/grub/grub.cfg" "${MOUNT_EFI}/EFI/BOOT/grub.cfg"
-sudo cp "${ISO_DIR}/boot/grub/grub.cfg" "${MOUNT_EFI}/EFI/ubuntu/grub.cfg"
+mkdir -p "${OUTPUT_DIR}"
+rm -f "${TIMES_TMP}"
+stage dependencies
 
-sudo umount "${MOUNT_EFI}"
-rmdir "${MOUNT_EFI}"
+# Install dependencies
+echo "==> Installing build dependencies..."
+# Concurrent builds wait for each other's dpkg lock instead of failing
+sudo apt-get update
+sudo apt-get install -y -o DPkg::Lock::Timeout=600 \
+    debootstrap \
+    squashfs-tools \
+    xorriso \
+    isolinux \
+    syslinux-utils \
+    grub-pc-bin \
+    grub-efi-amd64-bin \
+    grub-efi-amd64-signed \
+    shim-signed \
+    mtools \
+    dosfstools \
+    zsync
+
+# This build's tree, locked for its whole life; stale trees of dead builds go
+echo "==> Build tree: ${BUILD_DIR}"
+mkdir -p "${BUILD_ROOT}" "${OUTPUT_DIR}" "${CACHE_DIR}"
+exec {BUILD_LOCK}> "${BUILD_DIR}.lock"
+flock "${BUILD_LOCK}"
+prune_stale_builds
+mkdir -p "${BUILD_DIR}"
+
+# Fast mode: stage the build tree (base rebuild, flavor layers, ISO trees) in RAM if it fits
+if [[ "${FAST_BUILD}" == "1" ]]; then
+    AVAILABLE_KB=$(awk '/^MemAvailable:/ {print $2}' /proc/meminfo)
+    if (( AVAILABLE_KB >= TMPFS_MIN_GIB * 1024 * 1024 )); then
+        # Leave 2 GiB for mksquashfs and xorriso themselves
+        TMPFS_KB=$((AVAILABLE_KB - 2 * 1024 * 1024))
+        echo "==> Fast build: staging ${BUILD_DIR} on tmpfs ($((TMPFS_KB / 1024 / 1024)) GiB)"
+        sudo mount -t tmpfs -o "size=${TMPFS_KB}k,mode=0755" karmaos-build "${BUILD_DIR}"
+    else
+        echo "==> Fast build: only $((AVAILABLE_KB / 1024 / 1024)) GiB RAM available" \
+             "(need ${TMPFS_MIN_GIB}), building on disk"
+    fi
+fi
 
-# Also copy to EFI/boot for direct boot
-sudo cp /usr/lib/grub/x86_64-efi-signed/grubx64.efi.signed "${ISO_DIR}/EFI/BOOT/GRUBX64.EFI" 2>/dev/null || true
-if [ -f /usr/lib/shim/shimx64.efi.signed ]; then
-    sudo cp /usr/lib/shim/shimx64.efi.signed "${ISO_DIR}/EFI/BOOT/BOOTX64.EFI"
+# ============================================
+# Shared base chroot, cached by the definition that produced it
+# ============================================
+stage base
+BASE_KEY=$(printf '%s\n' "${CODENAME}" "${ARCH}" "$(declare -f build_base)" | sha256sum | cut -c1-16)
+BASE_DIR="${CACHE_DIR}/base-${BASE_KEY}"
+# Each base has its own lock: shared while builds use it as their overlay lower
+# layer, exclusive only while it is rebuilt. Reusing a fresh base therefore
+# never waits for another build.
+exec {BASE_LOCK}> "${BASE_DIR}.lock"
+flock -s "${BASE_LOCK}"
+if base_is_fresh; then
+    echo "==> Reusing cached base chroot ${BASE_KEY}"
+    BASE_CACHE=hit
+else
+    flock -u "${BASE_LOCK}"
+    flock -x "${BASE_LOCK}"
+    # Another build may have rebuilt it while this one waited
+    if base_is_fresh; then
+        echo "==> Reusing cached base chroot ${BASE_KEY}"
+        BASE_CACHE=hit
+    else
+        BASE_CACHE=miss
+        # A base build that died may have left its chroot binds behind
+        remove_tree "${BASE_DIR}"
+        mkdir -p "${BASE_DIR}"
+        if mountpoint -q "${BUILD_DIR}"; then
+            # Fast mode on tmpfs: debootstrap and apt run in RAM, the cache gets a copy
+            build_base "${BUILD_DIR}/base"
+            echo "==> Copying the base chroot to ${BASE_DIR}"
+            sudo cp -a "${BUILD_DIR}/base" "${BASE_DIR}/chroot"
+            sudo rm -rf "${BUILD_DIR}/base"
+        else
+            build_base "${BASE_DIR}/chroot"
+        fi
+        # The marker must not reach the disk before the tree it vouches for
+        sync -f "${BASE_DIR}/chroot"
+        touch "${BASE_DIR}/.complete"
+        sync -f "${BASE_DIR}/.complete"
+        prune_old_bases
+    fi
+    flock -s "${BASE_LOCK}"
 fi
 
-# Also provide grub.cfg at EFI/boot for some UEFI implementations
-sudo mkdir -p "${ISO_DIR}/EFI/BOOT" "${ISO_DIR}/EFI/ubuntu"
-sudo cp "${ISO_DIR}/boot/grub/grub.cfg" "${ISO_DIR}/EFI/BOOT/grub.cfg" || true
-sudo cp "${ISO_DIR}/boot/grub/grub.cfg" "${ISO_DIR}/EFI/ubuntu/grub.cfg" || true
+# ============================================
+# Flavor layers: copy-on-write overlays on the base
+# ============================================
+for flavor in ${FLAVORS}; do
+    load_flavor "${flavor}"
+    stage "customize:${flavor}"
+    layer="${BUILD_DIR}/${flavor}"
+    mkdir -p "${layer}/upper" "${layer}/work" "${layer}/chroot" "${layer}/iso"
+    if ! sudo mount -t overlay "overlay-${flavor}" \
+            -o "lowerdir=${BASE_DIR}/chroot,upperdir=${layer}/upper,workdir=${layer}/work" \
+            "${layer}/chroot"; then
+        echo "==> overlayfs unavailable, copying the base for ${flavor}"
+        sudo cp -a --reflink=auto "${BASE_DIR}/chroot/." "${layer}/chroot/"
+    fi
+    customize_flavor "${layer}/chroot"
+done
 
 # ============================================
-# STEP 7: Create bootable ISO
+# Squashfs and ISO assembly, all flavors at once
 # ============================================
-echo "==> Creating bootable hybrid ISO..."
-
-FINAL_ISO="${OUTPUT_DIR}/karmaos-${VERSION}-${ARCH}.iso"
-
-echo "==> Fixing ISO tree permissions for xorriso..."
-sudo chown -R "$(id -u):$(id -g)" "${ISO_DIR}"
-sudo chmod -R a+rX "${ISO_DIR}"
-
-VOLID="KARMAOS_${VERSION//./_}"
-
-xorriso -as mkisofs \
-    -iso-level 3 \
-    -full-iso9660-filenames \
-    -volid "${VOLID}" \
-    -output "${FINAL_ISO}" \
-    -eltorito-boot isolinux/isolinux.bin \
-        -no-emul-boot \
-        -boot-load-size 4 \
-        -boot-info-table \
-        -isohybrid-mbr /usr/lib/ISOLINUX/isohdpfx.bin \
-    -eltorito-alt-boot \
-        -e boot/grub/efi.img \
-        -no-emul-boot \
-        -isohybrid-gpt-basdat \
-    "${ISO_DIR}"
+stage assemble
+FLAVOR_COUNT=$(wc -w <<< "${FLAVORS}")
+SQUASHFS_PROCESSORS=$(( $(nproc) / FLAVOR_COUNT ))
+SQUASHFS_PROCESSORS=$(( SQUASHFS_PROCESSORS > 0 ? SQUASHFS_PROCESSORS : 1 ))
+declare -A ASSEMBLY_PIDS=()
+for flavor in ${FLAVORS}; do
+    (
+        load_flavor "${flavor}"
+        assemble_flavor "${BUILD_DIR}/${flavor}/chroot" "${BUILD_DIR}/${flavor}/iso"
+    ) > >(sed -u "s/^/[${flavor}] /") 2>&1 &
+    ASSEMBLY_PIDS["${flavor}"]=$!
+done
+FAILED=""
+for flavor in "${!ASSEMBLY_PIDS[@]}"; do
+    if ! wait "${ASSEMBLY_PIDS[${flavor}]}"; then
+        FAILED="${FAILED} ${flavor}"
+    fi
+done
+if [[ -n "${FAILED}" ]]; then
+    echo "ERROR: assembly failed for:${FAILED}"
+    exit 1
+fi
 
 # ============================================
 # STEP 8: Generate checksums and finish
 # ============================================
+stage checksums
 echo "==> Generating checksums..."
 cd "${OUTPUT_DIR}"
-sha256sum "$(basename ${FINAL_ISO})" > SHA256SUMS
+ISOS=()
+for flavor in ${FLAVORS}; do
+    load_flavor "${flavor}"
+    ISOS+=("karmaos-${VERSION}${FLAVOR_SUFFIX}-${ARCH}.iso")
+done
+sha256sum "${ISOS[@]}" > SHA256SUMS
+stage ""
+# A base cache miss dominates the total, so only same-cache builds compare
+TIMES_FILE="${OUTPUT_DIR}/build-times.${BUILD_MODE}.base-${BASE_CACHE}.tsv"
+NORMAL_TIMES="${OUTPUT_DIR}/build-times.normal.base-${BASE_CACHE}.tsv"
+awk -v cache="${BASE_CACHE}" '{ print } END { printf "base-cache\t%s\n", cache }' \
+    "${TIMES_TMP}" > "${TIMES_FILE}"
+rm -f "${TIMES_TMP}"
 
 echo ""
 echo "=============================================="
 echo "  BUILD COMPLETE!"
 echo "=============================================="
-echo "  ISO: ${FINAL_ISO}"
-echo "  Size: $(du -h ${FINAL_ISO} | cut -f1)"
+for iso in "${ISOS[@]}"; do
+    echo "  ISO: ${OUTPUT_DIR}/${iso} ($(du -h "${iso}" | cut -f1))"
+done
 echo ""
 echo "  Boot compatibility:"
 echo "    ✓ BIOS (Legacy) - VirtualBox, older PCs"
 echo "    ✓ UEFI - Modern PCs, QEMU, UTM"
 echo "    ✓ Hybrid - USB boot on any system"
+echo ""
+echo "  Stage times (${BUILD_MODE} build, base cache ${BASE_CACHE}):"
+if [[ "${BUILD_MODE}" == "fast" && -f "${NORMAL_TIMES}" ]]; then
+    # Compare with the last normal build on this machine with the same base cache
+    awk -F'\t' 'NR == FNR { normal[$1] = $2; next }
+        $1 == "base-cache" { next }
+        { saved = ($1 in normal) ? sprintf("%+ds", normal[$1] - $2) : "n/a"
+          printf "    %-22s %6ds   saved vs normal: %s\n", $1, $2, saved }' \
+        "${NORMAL_TIMES}" "${TIMES_FILE}"
+else
+    awk -F'\t' '$1 != "base-cache" { printf "    %-22s %6ds\n", $1, $2 }' "${TIMES_FILE}"
+fi
 echo "=============================================="
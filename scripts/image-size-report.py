@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+KarmaOS image size report
+Attributes the live image size to packages and directories, diffs it against
+the previous build's report and enforces the budget in image-budget.conf.
+
+    sudo scripts/image-size-report.py build/chroot \\
+        --squashfs build/iso/casper/filesystem.squashfs \\
+        --previous dist/size-report.prev.json \\
+        --budget scripts/image-budget.conf \\
+        --block-size 1M \\
+        --output dist/size-report.json
+
+Compressed sizes are estimates: every file is compressed in squashfs-sized
+blocks with a fast compressor, and the totals are scaled so that they add up
+to the real filesystem.squashfs size.
+
+Exit status: 0 ok, 2 budget exceeded.
+"""
+
+import argparse
+import datetime
+import functools
+import json
+import os
+import subprocess
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024    # mksquashfs -b 1M
+UNPACKAGED = '(unpackaged)'
+MIB = 1024 * 1024
+# Smaller moves are noise from rescaling the estimate to the real squashfs size
+MIN_CHANGE = 64 * 1024
+# Directories that are mount points in the live system, not image content
+SKIPPED_DIRS = ('proc', 'sys', 'dev', 'run', 'tmp')
+# usrmerge: dpkg lists may still name the /lib, /bin... paths
+MERGED_DIRS = ('bin', 'sbin', 'lib', 'lib32', 'lib64', 'libx32')
+
+
+def read_packages(root):
+    """Installed packages with their dpkg Installed-Size (KiB)."""
+    out = subprocess.run(
+        ['dpkg-query', f'--admindir={root}/var/lib/dpkg', '-W',
+         '--showformat=${Package}\t${Installed-Size}\t${db:Status-Abbrev}\n'],
+        capture_output=True, text=True, check=True).stdout
+    packages = {}
+    for line in out.splitlines():
+        name, size, status = (line.split('\t') + ['', ''])[:3]
+        if status.startswith('ii'):
+            packages[name] = int(size or 0)
+    return packages
+
+
+def read_owners(root):
+    """Map each packaged path (as it exists in the tree) to its package."""
+    info = os.path.join(root, 'var', 'lib', 'dpkg', 'info')
+    merged = {d for d in MERGED_DIRS if os.path.islink(os.path.join(root, d))}
+    owners = {}
+    for entry in sorted(os.listdir(info)):
+        if not entry.endswith('.list'):
+            continue
+        package = entry[:-len('.list')].split(':')[0]
+        with open(os.path.join(info, entry), 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                path = line.rstrip('\n')
+                top = path.split('/', 2)[1] if path.count('/') > 1 else ''
+                if top in merged:
+                    path = '/usr' + path
+                owners.setdefault(path, package)
+    return owners
+
+
+def walk(root):
+    """Yield (path relative to root, size) for every regular file, hardlinks once."""
+    root_dev = os.lstat(root).st_dev
+    seen = set()
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel = os.path.relpath(dirpath, root)
+        rel_dir = '/' if rel == '.' else '/' + rel
+        if rel_dir == '/':
+            dirnames[:] = [d for d in dirnames if d not in SKIPPED_DIRS]
+        kept = []
+        for d in dirnames:
+            try:
+                if os.lstat(os.path.join(dirpath, d)).st_dev == root_dev:
+                    kept.append(d)
+            except OSError:
+                pass
+        dirnames[:] = kept
+        for name in filenames:
+            try:
+                st = os.lstat(os.path.join(dirpath, name))
+            except OSError:
+                continue
+            if not (st.st_mode & 0o170000 == 0o100000):
+                continue
+            if st.st_nlink > 1:
+                # Overlay chroots mix inodes from several filesystems
+                if (st.st_dev, st.st_ino) in seen:
+                    continue
+                seen.add((st.st_dev, st.st_ino))
+            yield os.path.join(rel_dir, name), st.st_size
+
+
+def parse_block_size(value):
+    """mksquashfs -b syntax: bytes, or a K/M suffix."""
+    value = value.strip().upper()
+    for suffix, factor in (('K', 1024), ('M', 1024 * 1024)):
+        if value.endswith(suffix):
+            return int(value[:-1]) * factor
+    return int(value)
+
+
+def compressed_size(path, block_size=DEFAULT_BLOCK_SIZE):
+    """Bytes `path` takes once compressed block by block (fast proxy for xz)."""
+    total = 0
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    break
+                total += min(len(block), len(zlib.compress(block, 1)))
+    except OSError:
+        pass
+    return total
+
+
+def directory_key(path, depth):
+    parts = path.strip('/').split('/')[:-1]
+    return '/' + '/'.join(parts[:depth])
+
+
+def analyse(root, squashfs=None, depth=2, estimate=True, jobs=None,
+            block_size=DEFAULT_BLOCK_SIZE):
+    packages = read_packages(root)
+    owners = read_owners(root)
+    files = list(walk(root))
+
+    proxies = [0] * len(files)
+    if estimate:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            paths = (root + path for path, _ in files)
+            proxies = list(pool.map(functools.partial(compressed_size, block_size=block_size),
+                                    paths, chunksize=256))
+
+    squashfs_bytes = os.path.getsize(squashfs) if squashfs else None
+    total_proxy = sum(proxies)
+    scale = squashfs_bytes / total_proxy if squashfs_bytes and total_proxy else 1.0
+
+    by_package = {name: {'installed_kib': kib, 'bytes': 0, 'compressed': 0, 'files': 0}
+                  for name, kib in packages.items()}
+    by_dir, unpackaged = {}, {}
+    for (path, size), proxy in zip(files, proxies):
+        compressed = proxy * scale
+        owner = owners.get(path, UNPACKAGED)
+        entry = by_package.setdefault(owner, {'installed_kib': 0, 'bytes': 0, 'compressed': 0, 'files': 0})
+        entry['bytes'] += size
+        entry['compressed'] += compressed
+        entry['files'] += 1
+        key = directory_key(path, depth)
+        d = by_dir.setdefault(key, {'bytes': 0, 'compressed': 0})
+        d['bytes'] += size
+        d['compressed'] += compressed
+        if owner == UNPACKAGED:
+            u = unpackaged.setdefault(key, {'bytes': 0, 'compressed': 0})
+            u['bytes'] += size
+            u['compressed'] += compressed
+
+    for table in (by_package, by_dir, unpackaged):
+        for entry in table.values():
+            entry['compressed'] = int(entry['compressed'])
+
+    return {
+        'generated_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'root': os.path.abspath(root),
+        'estimated': estimate,
+        'squashfs_bytes': squashfs_bytes,
+        'files_bytes': sum(size for _, size in files),
+        'installed_kib': sum(packages.values()),
+        'packages': by_package,
+        'directories': by_dir,
+        'unpackaged': unpackaged,
+    }
+
+
+def _metric(entry):
+    """Compressed size when estimated, file bytes otherwise."""
+    return entry['compressed'] or entry['bytes']
+
+
+def diff(previous, current):
+    changes = []
+    for table in ('packages', 'directories'):
+        before, after = previous.get(table, {}), current[table]
+        for name in set(before) | set(after):
+            old = _metric(before[name]) if name in before else 0
+            new = _metric(after[name]) if name in after else 0
+            if abs(new - old) >= MIN_CHANGE:
+                state = 'added' if name not in before else 'removed' if name not in after else ''
+                changes.append((table, name, old, new, state))
+    changes.sort(key=lambda c: abs(c[3] - c[2]), reverse=True)
+    return changes
+
+
+def read_budget(path):
+    """KEY=VALUE file; empty values disable a check."""
+    budget = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if '=' in line:
+                key, _, value = line.partition('=')
+                if value.strip():
+                    budget[key.strip()] = float(value)
+    return budget
+
+
+def check_budget(budget, report, previous):
+    violations = []
+    squashfs = report['squashfs_bytes']
+    if squashfs is not None and 'SQUASHFS_MAX_MIB' in budget and squashfs > budget['SQUASHFS_MAX_MIB'] * MIB:
+        violations.append(f"filesystem.squashfs is {squashfs / MIB:.0f} MiB "
+                          f"(budget {budget['SQUASHFS_MAX_MIB']:g} MiB)")
+    if 'INSTALLED_MAX_MIB' in budget and report['files_bytes'] > budget['INSTALLED_MAX_MIB'] * MIB:
+        violations.append(f"image content is {report['files_bytes'] / MIB:.0f} MiB "
+                          f"(budget {budget['INSTALLED_MAX_MIB']:g} MiB)")
+    if 'PACKAGE_MAX_MIB' in budget:
+        for name, entry in report['packages'].items():
+            if name != UNPACKAGED and entry['bytes'] > budget['PACKAGE_MAX_MIB'] * MIB:
+                violations.append(f"package {name} is {entry['bytes'] / MIB:.0f} MiB "
+                                  f"(budget {budget['PACKAGE_MAX_MIB']:g} MiB per package)")
+    if (previous and 'MAX_GROWTH_MIB' in budget and squashfs is not None
+            and previous.get('squashfs_bytes')):
+        growth = squashfs - previous['squashfs_bytes']
+        if growth > budget['MAX_GROWTH_MIB'] * MIB:
+            violations.append(f"filesystem.squashfs grew by {growth / MIB:.0f} MiB since the "
+                              f"previous build (budget {budget['MAX_GROWTH_MIB']:g} MiB)")
+    return violations
+
+
+def _mib(value):
+    return f'{value / MIB:9.1f}'
+
+
+def print_report(report, changes, violations, top):
+    size_label = 'compressed' if report['estimated'] else 'bytes'
+    if report['squashfs_bytes']:
+        print(f"filesystem.squashfs: {report['squashfs_bytes'] / MIB:.1f} MiB")
+    print(f"image content: {report['files_bytes'] / MIB:.1f} MiB, "
+          f"dpkg Installed-Size: {report['installed_kib'] / 1024:.1f} MiB")
+
+    for title, table in (('packages', report['packages']),
+                         ('directories', report['directories']),
+                         ('unpackaged files by directory', report['unpackaged'])):
+        print(f"\nTop {top} {title} (MiB, {size_label} / on disk):")
+        rows = sorted(table.items(), key=lambda item: _metric(item[1]), reverse=True)[:top]
+        for name, entry in rows:
+            print(f"  {_mib(_metric(entry))} {_mib(entry['bytes'])}  {name}")
+
+    if changes is not None:
+        print(f"\nLargest changes since the previous build (MiB, {size_label}):")
+        for table, name, old, new, state in changes[:top]:
+            print(f"  {(new - old) / MIB:+9.1f}  {table[:-1] if table == 'packages' else 'dir'} {name} {state}")
+        if not changes:
+            print("  (none)")
+
+    for violation in violations:
+        print(f"\nBUDGET EXCEEDED: {violation}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='KarmaOS image size report')
+    parser.add_argument('root', help='Chroot directory of the live image')
+    parser.add_argument('--squashfs', help='filesystem.squashfs built from root')
+    parser.add_argument('--previous', help="Previous build's JSON report")
+    parser.add_argument('--budget', help='Budget file (KEY=VALUE)')
+    parser.add_argument('--output', help='Write the JSON report here')
+    parser.add_argument('--block-size', type=parse_block_size, default=DEFAULT_BLOCK_SIZE,
+                        help='mksquashfs -b of the image (default 1M)')
+    parser.add_argument('--depth', type=int, default=2, help='Directory depth (default 2)')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--jobs', type=int, default=None)
+    parser.add_argument('--no-estimate', action='store_true',
+                        help='Skip the compressed size estimate')
+    args = parser.parse_args(argv)
+
+    report = analyse(args.root, args.squashfs, args.depth, not args.no_estimate, args.jobs,
+                     args.block_size)
+
+    previous = None
+    if args.previous and os.path.exists(args.previous):
+        with open(args.previous, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+    changes = diff(previous, report) if previous else None
+    violations = check_budget(read_budget(args.budget), report, previous) if args.budget else []
+    report['budget_violations'] = violations
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+    print_report(report, changes, violations, args.top)
+    return 2 if violations else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
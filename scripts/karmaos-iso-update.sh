@@ -0,0 +1,108 @@
+#!/usr/bin/env bash
+# KarmaOS ISO delta update
+# Rebuilds a new KarmaOS ISO from a previous local one, downloading only the
+# blocks that changed (zsync control files are published next to SHA256SUMS).
+#
+# Usage: scripts/karmaos-iso-update.sh <source> [old-iso] [iso-name]
+#   source    URL of the directory holding the new build, or a local directory
+#             (served on 127.0.0.1 while the update runs)
+#   old-iso   previous ISO to reuse (default: newest dist/karmaos-*.iso)
+#   iso-name  ISO to rebuild (default: same name as old-iso if the new build
+#             has it, else the first ISO listed in SHA256SUMS)
+#
+# Offline test, with two builds copied side by side:
+#   scripts/karmaos-iso-update.sh builds/new builds/old/karmaos-26.01-amd64.iso
+#
+# Needs: zsync, curl, python3 (local sources only)
+
+set -euo pipefail
+
+SOURCE="${1:-}"
+OLD_ISO="${2:-}"
+ISO_NAME="${3:-}"
+OUTPUT_DIR="$(pwd)/dist/update"
+
+if [[ -z "${SOURCE}" ]]; then
+    echo "Usage: $0 <source-url-or-dir> [old-iso] [iso-name]"
+    exit 1
+fi
+
+for tool in zsync curl; do
+    if ! command -v "${tool}" &> /dev/null; then
+        echo "ERROR: ${tool} not found (sudo apt-get install ${tool})"
+        exit 1
+    fi
+done
+
+if [[ -z "${OLD_ISO}" ]]; then
+    OLD_ISO=$(ls -t dist/karmaos-*.iso 2>/dev/null | head -n1 || true)
+fi
+if [[ -z "${OLD_ISO}" || ! -f "${OLD_ISO}" ]]; then
+    echo "ERROR: no previous ISO found, pass it as second argument"
+    exit 1
+fi
+OLD_ISO="$(realpath "${OLD_ISO}")"
+
+SERVER_PID=""
+cleanup() {
+    if [[ -n "${SERVER_PID}" ]]; then
+        kill "${SERVER_PID}" 2>/dev/null || true
+    fi
+}
+trap cleanup EXIT
+
+# A local directory is served over HTTP, the only transport zsync speaks, by a
+# server that honours Range requests (python3 -m http.server does not)
+if [[ -d "${SOURCE}" ]]; then
+    PORT=$(python3 -c 'import socket; s = socket.socket(); s.bind(("127.0.0.1", 0)); print(s.getsockname()[1])')
+    python3 "$(dirname "$(realpath "$0")")/range-http-server.py" \
+        --bind 127.0.0.1 --directory "${SOURCE}" "${PORT}" > /dev/null 2>&1 &
+    SERVER_PID=$!
+    BASE_URL="http://127.0.0.1:${PORT}"
+    for _ in $(seq 1 50); do
+        if curl -fsS -o /dev/null "${BASE_URL}/SHA256SUMS" 2>/dev/null; then
+            break
+        fi
+        sleep 0.1
+    done
+else
+    BASE_URL="${SOURCE%/}"
+fi
+
+mkdir -p "${OUTPUT_DIR}"
+cd "${OUTPUT_DIR}"
+curl -fsS "${BASE_URL}/SHA256SUMS" -o SHA256SUMS
+
+if [[ -z "${ISO_NAME}" ]]; then
+    ISO_NAME=$(awk -v n="$(basename "${OLD_ISO}")" '$2 == n {print $2}' SHA256SUMS)
+fi
+if [[ -z "${ISO_NAME}" ]]; then
+    ISO_NAME=$(awk 'NR == 1 {print $2}' SHA256SUMS)
+fi
+
+echo "==> Updating ${ISO_NAME} from $(basename "${OLD_ISO}")"
+echo "    Source: ${BASE_URL}"
+
+curl -fsS "${BASE_URL}/${ISO_NAME}.zsync" -o "${ISO_NAME}.zsync"
+CONTROL_BYTES=$(stat -c %s "${ISO_NAME}.zsync")
+
+zsync -i "${OLD_ISO}" -o "${ISO_NAME}" -u "${BASE_URL}/${ISO_NAME}.zsync" "${ISO_NAME}.zsync" \
+    2>&1 | tee "${ISO_NAME}.zsync.log"
+
+echo "==> Verifying checksum..."
+awk -v n="${ISO_NAME}" '$2 == n' SHA256SUMS | sha256sum -c -
+
+# zsync ends with "used <bytes> local, fetched <bytes>"
+read -r USED FETCHED < <(sed -n 's/.*used \([0-9]*\) local, fetched \([0-9]*\).*/\1 \2/p' \
+    "${ISO_NAME}.zsync.log" | tail -n1; echo "0 0")
+SIZE=$(stat -c %s "${ISO_NAME}")
+DOWNLOADED=$((FETCHED + CONTROL_BYTES))
+SAVED=$((SIZE - DOWNLOADED))
+
+echo ""
+echo "=============================================="
+echo "  ISO: ${OUTPUT_DIR}/${ISO_NAME} ($((SIZE / 1024 / 1024)) MiB)"
+echo "  Reused from $(basename "${OLD_ISO}"): $((USED / 1024 / 1024)) MiB"
+echo "  Downloaded: $((DOWNLOADED / 1024 / 1024)) MiB (control file: $((CONTROL_BYTES / 1024)) KiB)"
+echo "  Saved: $((SAVED / 1024 / 1024)) MiB ($((100 * SAVED / SIZE))%)"
+echo "=============================================="
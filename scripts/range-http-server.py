@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+KarmaOS range HTTP server
+Serves a local build directory for zsync (scripts/karmaos-iso-update.sh).
+
+    scripts/range-http-server.py --bind 127.0.0.1 --directory builds/new 8000
+
+python3 -m http.server ignores Range headers and sends whole files, which
+zsync rejects. This one answers 206 with the requested bytes, as a
+multipart/byteranges body when several ranges are asked at once (zsync
+batches its block requests that way).
+"""
+
+import argparse
+import functools
+import os
+import shutil
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+BOUNDARY = 'karmaos-byteranges'
+CHUNK = 64 * 1024
+
+
+def parse_ranges(header, size):
+    """(start, end) pairs, inclusive, of a "bytes=..." Range header.
+
+    None when the header is malformed (the whole file is sent instead), an
+    empty list when no range lies inside the file.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip() != 'bytes' or not spec:
+        return None
+    ranges = []
+    for part in spec.split(','):
+        first, dash, last = part.strip().partition('-')
+        if not dash:
+            return None
+        try:
+            if first:
+                start = int(first)
+                if start >= size:
+                    # Unsatisfiable, whatever the end says: skip it
+                    continue
+                end = int(last) if last else size - 1
+                if end < start:
+                    return None
+            elif last:
+                start = max(size - int(last), 0)
+                end = size - 1
+            else:
+                return None
+        except ValueError:
+            return None
+        end = min(end, size - 1)
+        if start <= end:
+            ranges.append((start, end))
+    return ranges
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """SimpleHTTPRequestHandler with single and multiple byte ranges."""
+
+    ranges = None
+
+    def end_headers(self):
+        self.send_header('Accept-Ranges', 'bytes')
+        super().end_headers()
+
+    def send_head(self):
+        self.ranges = None
+        header = self.headers.get('Range')
+        path = self.translate_path(self.path)
+        if header is None or not os.path.isfile(path):
+            return super().send_head()
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, 'File not found')
+            return None
+        size = os.fstat(f.fileno()).st_size
+        ranges = parse_ranges(header, size)
+        if ranges is None:
+            f.close()
+            return super().send_head()
+        if not ranges:
+            f.close()
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None
+
+        ctype = self.guess_type(path)
+        self.send_response(HTTPStatus.PARTIAL_CONTENT)
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            self.send_header('Content-Type', ctype)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            self.send_header('Content-Length', str(end - start + 1))
+            self.ranges = [(None, start, end)]
+        else:
+            self.ranges = []
+            length = 0
+            for start, end in ranges:
+                part = (f'\r\n--{BOUNDARY}\r\n'
+                        f'Content-Type: {ctype}\r\n'
+                        f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n').encode()
+                self.ranges.append((part, start, end))
+                length += len(part) + end - start + 1
+            length += len(f'\r\n--{BOUNDARY}--\r\n')
+            self.send_header('Content-Type', f'multipart/byteranges; boundary={BOUNDARY}')
+            self.send_header('Content-Length', str(length))
+        self.end_headers()
+        return f
+
+    def copyfile(self, source, outputfile):
+        if self.ranges is None:
+            shutil.copyfileobj(source, outputfile)
+            return
+        for part, start, end in self.ranges:
+            if part is not None:
+                outputfile.write(part)
+            source.seek(start)
+            left = end - start + 1
+            while left > 0:
+                data = source.read(min(CHUNK, left))
+                if not data:
+                    break
+                outputfile.write(data)
+                left -= len(data)
+        if len(self.ranges) > 1:
+            outputfile.write(f'\r\n--{BOUNDARY}--\r\n'.encode())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='KarmaOS range HTTP server')
+    parser.add_argument('port', type=int)
+    parser.add_argument('--bind', default='127.0.0.1')
+    parser.add_argument('--directory', default=os.getcwd())
+    args = parser.parse_args(argv)
+
+    handler = functools.partial(RangeRequestHandler, directory=args.directory)
+    with ThreadingHTTPServer((args.bind, args.port), handler) as server:
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+build-iso.sh stale tree pruning
+A dead build's tree can still hold binds of host directories; pruning it must
+unmount them and leave the bound directories' contents alone.
+
+Runs the script's own functions as root in a throwaway mount namespace.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest
+
+SCRIPT = os.path.join(os.path.dirname(__file__), '..', 'build-iso.sh')
+
+
+def script_functions(*names):
+    """Source of the named shell functions of build-iso.sh."""
+    with open(SCRIPT) as f:
+        lines = f.read().splitlines()
+    chunks = []
+    for name in names:
+        start = lines.index(f'{name}() {{')
+        end = lines.index('}', start)
+        chunks.append('\n'.join(lines[start:end + 1]))
+    return '\n\n'.join(chunks)
+
+
+@unittest.skipUnless(os.geteuid() == 0 and shutil.which('unshare'),
+                     'needs root and unshare for bind mounts')
+class PruneStaleBuildsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.host = os.path.join(self.tmp, 'host-dev')
+        self.build_root = os.path.join(self.tmp, 'build')
+        os.makedirs(self.host)
+        with open(os.path.join(self.host, 'node'), 'w') as f:
+            f.write('host')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def prune(self, setup):
+        # sudo is a no-op here: the test already runs as root
+        script = '\n'.join([
+            'set -euo pipefail',
+            'sudo() { "$@"; }',
+            script_functions('remove_tree', 'prune_stale_builds'),
+            f'BUILD_ROOT={self.build_root}',
+            f'BUILD_DIR={self.build_root}/current',
+            setup,
+            'prune_stale_builds',
+        ])
+        return subprocess.run(['unshare', '--mount', '--propagation', 'private',
+                               'bash', '-c', script],
+                              capture_output=True, text=True, check=True)
+
+    def test_unmounts_binds_before_removing(self):
+        # Layout of the older script: one build/chroot with /dev bound in
+        chroot_dev = os.path.join(self.build_root, 'chroot', 'dev')
+        os.makedirs(chroot_dev)
+        self.prune(f'mount --bind {self.host} {chroot_dev}')
+
+        self.assertFalse(os.path.exists(os.path.join(self.build_root, 'chroot')))
+        with open(os.path.join(self.host, 'node')) as f:
+            self.assertEqual(f.read(), 'host')
+
+    def test_keeps_locked_trees(self):
+        running = os.path.join(self.build_root, 'running')
+        os.makedirs(running)
+        lock = running + '.lock'
+        holder = subprocess.Popen(['flock', lock, 'sleep', '30'])
+        try:
+            # Wait until the holder owns the lock
+            for _ in range(50):
+                if subprocess.run(['flock', '-n', lock, 'true']).returncode != 0:
+                    break
+                time.sleep(0.1)
+            self.prune('')
+        finally:
+            holder.kill()
+            holder.wait()
+        self.assertTrue(os.path.isdir(running))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+range-http-server.py
+Range parsing and the status codes zsync relies on: 206 for ranges inside
+the file, 416 for ranges past its end.
+"""
+
+import functools
+import http.client
+import importlib.util
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer
+
+_spec = importlib.util.spec_from_file_location(
+    'range_http_server', os.path.join(os.path.dirname(__file__), '..', 'range-http-server.py'))
+range_http_server = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(range_http_server)
+
+parse_ranges = range_http_server.parse_ranges
+
+
+class _QuietHandler(range_http_server.RangeRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class ParseRangesTest(unittest.TestCase):
+
+    def test_ranges_inside_the_file(self):
+        self.assertEqual(parse_ranges('bytes=0-99', 1000), [(0, 99)])
+        self.assertEqual(parse_ranges('bytes=900-', 1000), [(900, 999)])
+        self.assertEqual(parse_ranges('bytes=-100', 1000), [(900, 999)])
+        self.assertEqual(parse_ranges('bytes=990-2000', 1000), [(990, 999)])
+        self.assertEqual(parse_ranges('bytes=0-9, 20-29', 1000), [(0, 9), (20, 29)])
+
+    def test_ranges_past_the_end_are_unsatisfiable(self):
+        self.assertEqual(parse_ranges('bytes=2000-', 1000), [])
+        self.assertEqual(parse_ranges('bytes=1000-1999', 1000), [])
+        self.assertEqual(parse_ranges('bytes=0-9, 2000-', 1000), [(0, 9)])
+
+    def test_malformed_headers(self):
+        self.assertIsNone(parse_ranges('bytes=99-0', 1000))
+        self.assertIsNone(parse_ranges('bytes=-', 1000))
+        self.assertIsNone(parse_ranges('bytes=a-b', 1000))
+        self.assertIsNone(parse_ranges('items=0-9', 1000))
+
+
+class RangeServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.data = bytes(range(256)) * 4
+        with open(os.path.join(self.tmp, 'image.iso'), 'wb') as f:
+            f.write(self.data)
+        handler = functools.partial(_QuietHandler, directory=self.tmp)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp)
+
+    def get(self, range_header):
+        conn = http.client.HTTPConnection(*self.server.server_address, timeout=5)
+        self.addCleanup(conn.close)
+        conn.request('GET', '/image.iso', headers={'Range': range_header})
+        response = conn.getresponse()
+        return response, response.read()
+
+    def test_single_range(self):
+        response, body = self.get('bytes=10-19')
+        self.assertEqual(response.status, 206)
+        self.assertEqual(response.getheader('Content-Range'), 'bytes 10-19/1024')
+        self.assertEqual(body, self.data[10:20])
+
+    def test_open_range_past_the_end(self):
+        response, body = self.get('bytes=2000-')
+        self.assertEqual(response.status, 416)
+        self.assertEqual(response.getheader('Content-Range'), 'bytes */1024')
+        self.assertEqual(body, b'')
+
+
+if __name__ == '__main__':
+    unittest.main()
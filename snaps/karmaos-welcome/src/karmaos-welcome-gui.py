@@ -6,27 +6,44 @@ Live CD / First Boot experience
 
 import gi
 gi.require_version('Gtk', '3.0')
-# Try to load WebKit - prefer 6.0, fallback to 4.1, then 4.0
-try:
-    gi.require_version('WebKit', '6.0')
-    from gi.repository import Gtk, GdkPixbuf, GLib, Gdk
-    from gi.repository import WebKit as WebKit2
-    WEBKIT_AVAILABLE = True
-except (ValueError, ImportError):
-    try:
-        gi.require_version('WebKit2', '4.1')
-        from gi.repository import Gtk, GdkPixbuf, GLib, Gdk, WebKit2
-        WEBKIT_AVAILABLE = True
-    except (ValueError, ImportError):
-        try:
-            gi.require_version('WebKit2', '4.0')
-            from gi.repository import Gtk, GdkPixbuf, GLib, Gdk, WebKit2
-            WEBKIT_AVAILABLE = True
-        except (ValueError, ImportError):
-            from gi.repository import Gtk, GdkPixbuf, GLib, Gdk
-            WEBKIT_AVAILABLE = False
+from gi.repository import Gtk, GdkPixbuf, GLib, Gdk
+from gi.repository import Pango
+import importlib
+import json
 import os
+import shutil
 import subprocess
+import sys
+import threading
+import time
+
+import karmaos_tuning
+from karmaos_hardware import PROFILE_LOW, memory_profile, profile_machine
+from karmaos_network import WifiScanner
+from karmaos_requirements import probe_cached
+from karmaos_resources import RESOURCES_URL, ResourceCache, page_links
+from karmaos_snapd import SNAPD_SOCKET, RefreshCoordinator, SnapdError
+import karmaos_watchdog
+from karmaos_watchdog import instrument
+
+# WebKit (and JavaScriptCore) is only loaded when the resources page first
+# needs a WebView, never in the low-memory profile
+_webkit = None
+
+
+def load_webkit():
+    """Import WebKit on first use - prefer 6.0, fallback to 4.1, then 4.0; None if missing."""
+    global _webkit
+    if _webkit is None:
+        for namespace, version in (('WebKit', '6.0'), ('WebKit2', '4.1'), ('WebKit2', '4.0')):
+            try:
+                gi.require_version(namespace, version)
+                _webkit = importlib.import_module(f'gi.repository.{namespace}')
+                break
+            except (ValueError, ImportError):
+                continue
+    return _webkit
+
 
 if os.environ.get('SNAP'):
     ASSETS_DIR = os.path.join(os.environ['SNAP'], 'share', 'karmaos')
@@ -45,24 +62,157 @@ class KarmaOSWelcome(Gtk.Window):
         self.current_page = 0
         self.is_live = self.detect_live_session()
         self.selected_keyboard = "ca"
+        self.memory_profile = memory_profile()
+        self.use_webkit = self.memory_profile != PROFILE_LOW
 
         # Main container
+        main_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        self.add(main_box)
         self.notebook = Gtk.Notebook()
         self.notebook.set_show_tabs(False)
         self.notebook.set_show_border(False)
-        self.add(self.notebook)
+        main_box.pack_start(self.notebook, True, True, 0)
+        main_box.pack_end(self._refresh_bar(), False, False, 0)
 
         # Build pages based on context
         if self.is_live:
             self.create_live_pages()
+            self._probe_requirements()
         else:
             self.create_installed_pages()
 
+    # ─────────────────────────────────────────────────────────────
+    # Snap refreshes: held while setting up, deferred to the night window
+    # ─────────────────────────────────────────────────────────────
+    def _refresh_bar(self):
+        self.refresh_coordinator = RefreshCoordinator()
+        self.refresh_hold_active = False
+        self.refresh_bar = Gtk.InfoBar()
+        self.refresh_bar.set_message_type(Gtk.MessageType.INFO)
+        self.refresh_bar.set_revealed(False)
+        self.refresh_label = Gtk.Label(xalign=0)
+        self.refresh_label.set_line_wrap(True)
+        self.refresh_bar.get_content_area().add(self.refresh_label)
+        self.refresh_btn = self.refresh_bar.add_button("Mettre à jour maintenant", 1)
+        self.refresh_bar.connect("response", self.on_refresh_bar_response)
+
+        if os.path.exists(SNAPD_SOCKET):
+            threading.Thread(target=self._hold_snap_refreshes, args=(False,), daemon=True).start()
+        return self.refresh_bar
+
+    def _hold_snap_refreshes(self, interactive):
+        try:
+            until = self.refresh_coordinator.hold(interactive=interactive)
+            pending = self.refresh_coordinator.pending()
+        except SnapdError as e:
+            if e.status in (401, 403):
+                GLib.idle_add(self._on_snap_hold_denied)
+            return
+        except (OSError, ValueError):
+            # snapd unreachable or answering garbage: leave refreshes alone
+            return
+        GLib.idle_add(self._on_snap_refreshes_held, until, pending)
+
+    def _on_snap_refreshes_held(self, until, pending):
+        if until is None:
+            # An indefinite hold set by the administrator: nothing for us to offer
+            return False
+        self.refresh_hold_active = True
+        text = f"Mises à jour des snaps reportées jusqu'à {until.strftime('%H:%M')}"
+        if pending:
+            text += " : " + ", ".join(pending)
+        self.refresh_label.set_text(text)
+        self.refresh_btn.set_label("Mettre à jour maintenant")
+        self.refresh_btn.set_sensitive(True)
+        self.refresh_bar.set_revealed(True)
+        return False
+
+    def _on_snap_hold_denied(self):
+        self.refresh_hold_active = False
+        self.refresh_label.set_text(
+            "Les mises à jour automatiques des snaps peuvent ralentir votre première session.")
+        self.refresh_btn.set_label("Reporter les mises à jour")
+        self.refresh_btn.set_sensitive(True)
+        self.refresh_bar.set_revealed(True)
+        return False
+
+    def on_refresh_bar_response(self, bar, response):
+        self.refresh_btn.set_sensitive(False)
+        if self.refresh_hold_active:
+            target = self._refresh_snaps_now
+        else:
+            target = self._hold_snap_refreshes
+        threading.Thread(target=target, args=(True,), daemon=True).start()
+
+    def _refresh_snaps_now(self, interactive):
+        try:
+            # Returns once snapd has accepted the refresh, which then runs on its own
+            self.refresh_coordinator.refresh_now(interactive=interactive)
+            ok = True
+        except (SnapdError, OSError, ValueError):
+            ok = False
+        GLib.idle_add(self._on_snaps_refreshing, ok)
+
+    def _on_snaps_refreshing(self, ok):
+        self.refresh_btn.set_sensitive(True)
+        if ok:
+            self.refresh_hold_active = False
+            self.refresh_bar.set_revealed(False)
+        return False
+
+    # ─────────────────────────────────────────────────────────────
+    # Installation requirements, probed once and shared with Calamares
+    # ─────────────────────────────────────────────────────────────
+    def _probe_requirements(self, refresh=()):
+        def worker():
+            result = probe_cached(refresh=refresh)
+            GLib.idle_add(self._on_requirements, result)
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _on_requirements(self, result):
+        checks = result['checks']
+        internet = checks.get('internet')
+        if internet is None:
+            self.net_status.set_markup('<span foreground="red">✗ Erreur réseau</span>')
+        elif internet['ok']:
+            self.net_status.set_markup('<span foreground="green">✓ Connecté à Internet</span>')
+        else:
+            self.net_status.set_markup('<span foreground="orange">⚠ Pas de connexion Internet</span>')
+
+        lines = []
+        storage, ram = checks.get('storage'), checks.get('ram')
+        if storage:
+            lines.append(self._requirement_line(
+                storage['ok'], f"Disque : {storage['value']:g} Go (minimum {storage['required']:g} Go)"))
+        if ram:
+            lines.append(self._requirement_line(
+                ram['ok'], f"Mémoire : {ram['value']:g} Go (minimum {ram['required']:g} Go)"))
+        power = checks.get('power')
+        if power:
+            lines.append(self._requirement_line(
+                power['ok'], "Sur secteur" if power['ok'] else "Sur batterie : branchez l'ordinateur"))
+        firmware, secure_boot = checks.get('firmware'), checks.get('secure_boot')
+        if firmware:
+            mode = "UEFI" if firmware['value'] == 'efi' else "BIOS"
+            if secure_boot and secure_boot['value']:
+                mode += ", Secure Boot actif"
+            lines.append(self._requirement_line(True, f"Micrologiciel : {mode}"))
+        self.requirements_label.set_markup('\n'.join(lines))
+        return False
+
+    def _requirement_line(self, ok, text):
+        color, mark = ('green', '✓') if ok else ('orange', '⚠')
+        return f'<span foreground="{color}">{mark}</span> {GLib.markup_escape_text(text)}'
+
     # ─────────────────────────────────────────────────────────────
     # Detection
     # ─────────────────────────────────────────────────────────────
     def detect_live_session(self) -> bool:
         """Return True when running from live media (casper)."""
+        # Debug/benchmark override: KARMAOS_WELCOME_LIVE=1 (or 0)
+        forced = os.environ.get('KARMAOS_WELCOME_LIVE')
+        if forced in ('0', '1'):
+            return forced == '1'
         try:
             with open('/proc/cmdline', 'r', encoding='utf-8') as f:
                 cmdline = f.read()
@@ -137,32 +287,139 @@ class KarmaOSWelcome(Gtk.Window):
         btn_box.pack_start(fix_btn, False, False, 0)
 
         refresh_btn = Gtk.Button.new_with_label("Actualiser")
-        refresh_btn.connect("clicked", lambda w: self.check_network())
+        refresh_btn.connect("clicked", self.on_refresh_network)
         btn_box.pack_start(refresh_btn, False, False, 0)
 
         page.pack_start(btn_box, False, False, 10)
 
+        # Wi-Fi networks, updated incrementally from NetworkManager signals
+        self.wifi_rows = {}
+        self.wifi_listbox = Gtk.ListBox()
+        self.wifi_listbox.set_selection_mode(Gtk.SelectionMode.SINGLE)
+        self.wifi_listbox.set_sort_func(self._sort_wifi_rows)
+        self.wifi_listbox.connect("row-selected", self.on_wifi_selected)
+        placeholder = Gtk.Label(label="Aucun réseau Wi-Fi détecté")
+        placeholder.set_opacity(0.7)
+        placeholder.show()
+        self.wifi_listbox.set_placeholder(placeholder)
+
+        wifi_scroll = Gtk.ScrolledWindow()
+        wifi_scroll.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
+        wifi_scroll.set_size_request(420, 180)
+        wifi_scroll.add(self.wifi_listbox)
+        page.pack_start(wifi_scroll, False, False, 0)
+
+        connect_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=10)
+        connect_box.set_halign(Gtk.Align.CENTER)
+        self.wifi_password = Gtk.Entry()
+        self.wifi_password.set_visibility(False)
+        self.wifi_password.set_placeholder_text("Mot de passe Wi-Fi")
+        self.wifi_password.set_sensitive(False)
+        self.wifi_password.connect("activate", self.on_wifi_connect)
+        connect_box.pack_start(self.wifi_password, False, False, 0)
+        self.wifi_connect_btn = Gtk.Button.new_with_label("Se connecter")
+        self.wifi_connect_btn.set_sensitive(False)
+        self.wifi_connect_btn.connect("clicked", self.on_wifi_connect)
+        connect_box.pack_start(self.wifi_connect_btn, False, False, 0)
+        page.pack_start(connect_box, False, False, 0)
+
         nav = self._nav_box(back=True, next_label="Suivant")
         page.pack_end(nav, False, False, 0)
 
         self.notebook.append_page(page)
-        GLib.timeout_add(500, self.check_network)
 
+        self.wifi = WifiScanner(self.on_wifi_diff)
+        self.wifi.start()
+
+    @instrument
     def check_network(self):
-        """Check internet connectivity."""
-        try:
-            ret = subprocess.run(
-                ["ping", "-c", "1", "-W", "2", "8.8.8.8"],
-                capture_output=True, timeout=5
-            )
-            if ret.returncode == 0:
-                self.net_status.set_markup('<span foreground="green">✓ Connecté à Internet</span>')
-            else:
-                self.net_status.set_markup('<span foreground="orange">⚠ Pas de connexion Internet</span>')
-        except Exception:
-            self.net_status.set_markup('<span foreground="red">✗ Erreur réseau</span>')
+        """Re-check internet connectivity; the other requirements stay cached."""
+        self.net_status.set_markup('<span foreground="gray">Vérification...</span>')
+        self._probe_requirements(refresh=('internet',))
         return False
 
+    def on_refresh_network(self, widget):
+        self.wifi.request_scan()
+        self.check_network()
+
+    def on_wifi_diff(self, added, removed, changed):
+        """Apply a batched access point diff to the list without rebuilding it."""
+        for net in removed:
+            row = self.wifi_rows.pop(net.ssid, None)
+            if row is not None:
+                self.wifi_listbox.remove(row)
+        for net in added:
+            row = self._wifi_row(net)
+            self.wifi_rows[net.ssid] = row
+            self.wifi_listbox.add(row)
+            row.show_all()
+        for net in changed:
+            row = self.wifi_rows.get(net.ssid)
+            if row is not None:
+                self._update_wifi_row(row, net)
+                row.changed()
+        if self.wifi_listbox.get_selected_row() is None:
+            self.on_wifi_selected(self.wifi_listbox, None)
+
+    def _wifi_row(self, net):
+        row = Gtk.ListBoxRow()
+        box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=10)
+        box.set_margin_start(10)
+        box.set_margin_end(10)
+        box.set_margin_top(6)
+        box.set_margin_bottom(6)
+        row.signal_image = Gtk.Image()
+        box.pack_start(row.signal_image, False, False, 0)
+        name = Gtk.Label(label=net.ssid, xalign=0)
+        name.set_ellipsize(Pango.EllipsizeMode.END)
+        box.pack_start(name, True, True, 0)
+        row.security_label = Gtk.Label()
+        row.security_label.set_opacity(0.7)
+        box.pack_end(row.security_label, False, False, 0)
+        row.add(box)
+        self._update_wifi_row(row, net)
+        return row
+
+    def _update_wifi_row(self, row, net):
+        row.network = net
+        if net.strength >= 75:
+            level = "excellent"
+        elif net.strength >= 50:
+            level = "good"
+        elif net.strength >= 25:
+            level = "ok"
+        else:
+            level = "weak"
+        row.signal_image.set_from_icon_name(f"network-wireless-signal-{level}-symbolic",
+                                            Gtk.IconSize.MENU)
+        row.security_label.set_text(net.security or "Ouvert")
+
+    def _sort_wifi_rows(self, row1, row2):
+        return row2.network.strength - row1.network.strength
+
+    def on_wifi_selected(self, listbox, row):
+        secured = row is not None and row.network.security not in ("", "802.1X")
+        self.wifi_password.set_sensitive(secured)
+        self.wifi_connect_btn.set_sensitive(row is not None and row.network.security != "802.1X")
+
+    def on_wifi_connect(self, widget):
+        row = self.wifi_listbox.get_selected_row()
+        if row is None or not self.wifi_connect_btn.get_sensitive():
+            return
+        ssid = row.network.ssid
+        self.net_status.set_markup(
+            f'<span foreground="gray">Connexion à {GLib.markup_escape_text(ssid)}...</span>')
+        self.wifi.connect_to(ssid, self.wifi_password.get_text(), self.on_wifi_connected)
+
+    def on_wifi_connected(self, ok, message):
+        if ok:
+            self.wifi_password.set_text("")
+            GLib.timeout_add(3000, self.check_network)
+        else:
+            self.net_status.set_markup(
+                f'<span foreground="red">✗ Échec de la connexion : {GLib.markup_escape_text(message)}</span>')
+
+    @instrument
     def on_fix_network(self, widget):
         """Try to fix networking."""
         self.net_status.set_markup('<span foreground="gray">Réparation en cours...</span>')
@@ -275,6 +532,7 @@ class KarmaOSWelcome(Gtk.Window):
 
         self.notebook.append_page(page)
 
+    @instrument
     def on_keyboard_changed(self, combo):
         tree_iter = combo.get_active_iter()
         if tree_iter:
@@ -299,6 +557,12 @@ class KarmaOSWelcome(Gtk.Window):
         desc.set_line_wrap(True)
         page.pack_start(desc, False, False, 20)
 
+        # Filled in by the requirements probe started at launch
+        self.requirements_label = Gtk.Label()
+        self.requirements_label.set_markup('<span foreground="gray">Vérification de la configuration...</span>')
+        self.requirements_label.set_justify(Gtk.Justification.LEFT)
+        page.pack_start(self.requirements_label, False, False, 0)
+
         btn_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=15)
         btn_box.set_halign(Gtk.Align.CENTER)
 
@@ -349,6 +613,7 @@ class KarmaOSWelcome(Gtk.Window):
 
         self.notebook.append_page(page)
 
+    @instrument
     def on_install_clicked(self, widget):
         """Launch installer and go to final page."""
         self.launch_installer()
@@ -358,6 +623,7 @@ class KarmaOSWelcome(Gtk.Window):
         """Just go to final page."""
         self.next_page()
 
+    @instrument
     def launch_installer(self):
         """Launch Calamares installer."""
         try:
@@ -380,27 +646,24 @@ class KarmaOSWelcome(Gtk.Window):
         title.set_markup('<span size="large" weight="bold">Ressources KarmaOS</span>')
         page.pack_start(title, False, False, 0)
 
-        if WEBKIT_AVAILABLE:
-            # WebKit WebView
-            self.webview = WebKit2.WebView()
-            self.webview.load_uri("https://karmaos.ovh/karmaos-welcome/")
-            self.webview.set_vexpand(True)
-            self.webview.set_hexpand(True)
-
-            scroll = Gtk.ScrolledWindow()
-            scroll.set_vexpand(True)
-            scroll.add(self.webview)
-            page.pack_start(scroll, True, True, 0)
-        else:
-            # Fallback: show link as text
-            info = Gtk.Label()
-            info.set_markup(
-                '<span size="large">Pour plus d\'informations, visitez :\n\n'
-                '<a href="https://karmaos.ovh/karmaos-welcome/">https://karmaos.ovh/karmaos-welcome/</a></span>'
-            )
-            info.set_justify(Gtk.Justification.CENTER)
-            info.set_line_wrap(True)
-            page.pack_start(info, True, True, 0)
+        # Served from the local cache; refreshed in the background once shown
+        self.resources = ResourceCache(os.path.join(ASSETS_DIR, 'karmaos-welcome.html'))
+        self.resources_refreshing = False
+        html, checked_at = self.resources.load()
+
+        self.resources_stamp = Gtk.Label()
+        self.resources_stamp.set_opacity(0.6)
+        self._set_resources_stamp(checked_at)
+        page.pack_start(self.resources_stamp, False, False, 0)
+
+        # A WebView only exists while this page is shown; low-memory
+        # machines get a native list of links instead
+        self.webview = None
+        self.web_content = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        self.web_content.set_vexpand(True)
+        page.pack_start(self.web_content, True, True, 0)
+        if not self.use_webkit:
+            self._show_native_resources(html)
 
         # Close button
         close_btn = Gtk.Button.new_with_label("Fermer")
@@ -411,13 +674,101 @@ class KarmaOSWelcome(Gtk.Window):
         btn_box.pack_start(close_btn, False, False, 0)
         page.pack_start(btn_box, False, False, 10)
 
-        self.notebook.append_page(page)
+        self.web_page_index = self.notebook.append_page(page)
+        self.notebook.connect("switch-page", self.on_web_page_switch)
+
+    def on_web_page_switch(self, notebook, page, page_num):
+        """Build the resources view on entry, tear the WebView down on exit."""
+        if page_num != self.web_page_index:
+            self._destroy_webview()
+            return
+        if self.use_webkit and load_webkit() is None:
+            # No WebKit typelib: same native list as the low-memory profile
+            self.use_webkit = False
+            self._show_native_resources(self.resources.load()[0])
+        if self.use_webkit:
+            self._create_webview()
+        if not self.resources_refreshing:
+            self.resources_refreshing = True
+            threading.Thread(target=self._refresh_resources, daemon=True).start()
+
+    def _create_webview(self):
+        if self.webview is not None:
+            return
+        WebKit2 = load_webkit()
+        # Ephemeral sessions own their network process, so it exits with the view
+        if hasattr(WebKit2, 'NetworkSession'):
+            self.webview = WebKit2.WebView(network_session=WebKit2.NetworkSession.new_ephemeral())
+        else:
+            self.webview = WebKit2.WebView.new_with_context(WebKit2.WebContext.new_ephemeral())
+        self.webview.set_vexpand(True)
+        self.webview.set_hexpand(True)
+        html, _checked_at = self.resources.load()
+        if html is not None:
+            self.webview.load_html(html, RESOURCES_URL)
+        else:
+            self.webview.load_uri(RESOURCES_URL)
+
+        scroll = Gtk.ScrolledWindow()
+        scroll.set_vexpand(True)
+        scroll.add(self.webview)
+        self.web_content.pack_start(scroll, True, True, 0)
+        scroll.show_all()
+
+    def _destroy_webview(self):
+        if self.webview is None:
+            return
+        webview, self.webview = self.webview, None
+        try:
+            webview.terminate_web_process()
+        except AttributeError:
+            pass
+        webview.get_parent().destroy()
+
+    def _show_native_resources(self, html):
+        for child in self.web_content.get_children():
+            child.destroy()
+        links = page_links(html) or [("Site de KarmaOS", RESOURCES_URL)]
+        box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=5)
+        box.set_valign(Gtk.Align.CENTER)
+        box.set_halign(Gtk.Align.CENTER)
+        for text, href in links:
+            box.pack_start(Gtk.LinkButton.new_with_label(href, text), False, False, 0)
+        self.web_content.pack_start(box, True, True, 0)
+        box.show_all()
+
+    def _refresh_resources(self):
+        try:
+            changed = self.resources.refresh()
+        except Exception:
+            changed = None
+        GLib.idle_add(self._on_resources_refreshed, changed)
+
+    def _on_resources_refreshed(self, changed):
+        self.resources_refreshing = False
+        html, checked_at = self.resources.load()
+        self._set_resources_stamp(checked_at)
+        if not changed or html is None:
+            return False
+        if self.webview is not None:
+            self.webview.load_html(html, RESOURCES_URL)
+        elif not self.use_webkit:
+            self._show_native_resources(html)
+        return False
+
+    def _set_resources_stamp(self, checked_at):
+        if checked_at is None:
+            text = "Version incluse avec le système"
+        else:
+            text = "Mis à jour le " + time.strftime("%Y-%m-%d à %H:%M", time.localtime(checked_at))
+        self.resources_stamp.set_markup(f'<span size="small">{text}</span>')
 
     # ─────────────────────────────────────────────────────────────
     # INSTALLED system pages (first boot after install)
     # ─────────────────────────────────────────────────────────────
     def create_installed_pages(self):
         self.create_installed_welcome()
+        self.create_installed_tuning()
 
     def create_installed_welcome(self):
         page = self._page_box()
@@ -445,8 +796,138 @@ class KarmaOSWelcome(Gtk.Window):
         btn.connect("clicked", lambda w: Gtk.main_quit())
         page.pack_start(btn, False, False, 0)
 
+        tune_btn = Gtk.Button.new_with_label("Optimiser pour cet ordinateur")
+        tune_btn.set_size_request(280, 40)
+        tune_btn.connect("clicked", lambda w: self.next_page())
+        page.pack_start(tune_btn, False, False, 0)
+
         self.notebook.append_page(page)
 
+    # Optional: hardware profile + reversible tuning
+    def create_installed_tuning(self):
+        page = self._page_box()
+
+        title = Gtk.Label()
+        title.set_markup('<span size="x-large" weight="bold">Optimiser KarmaOS pour cet ordinateur</span>')
+        page.pack_start(title, False, False, 0)
+
+        self.tuning_summary = Gtk.Label()
+        self.tuning_summary.set_markup('<span foreground="gray">Analyse du matériel...</span>')
+        self.tuning_summary.set_line_wrap(True)
+        self.tuning_summary.set_justify(Gtk.Justification.CENTER)
+        page.pack_start(self.tuning_summary, False, False, 10)
+
+        self.tuning_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=5)
+        page.pack_start(self.tuning_box, False, False, 0)
+
+        self.tuning_status = Gtk.Label()
+        self.tuning_status.set_line_wrap(True)
+        self.tuning_status.set_max_width_chars(70)
+        self.tuning_status.set_justify(Gtk.Justification.CENTER)
+        page.pack_start(self.tuning_status, False, False, 10)
+
+        nav = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=10)
+        nav.set_margin_top(20)
+        self.tuning_skip_btn = Gtk.Button.new_with_label("Passer")
+        self.tuning_skip_btn.connect("clicked", lambda w: Gtk.main_quit())
+        nav.pack_start(self.tuning_skip_btn, False, False, 0)
+        self.tuning_apply_btn = Gtk.Button.new_with_label("Appliquer")
+        self.tuning_apply_btn.set_sensitive(False)
+        self.tuning_apply_btn.connect("clicked", self.on_tuning_apply)
+        nav.pack_end(self.tuning_apply_btn, False, False, 0)
+        page.pack_end(nav, False, False, 0)
+
+        self.notebook.append_page(page)
+
+        self.tuning_checks = []
+        threading.Thread(target=self._profile_machine, daemon=True).start()
+
+    def _profile_machine(self):
+        profile = profile_machine()
+        GLib.idle_add(self._on_machine_profiled, profile, karmaos_tuning.plan(profile))
+
+    def _on_machine_profiled(self, profile, changes):
+        self.tuning_profile = profile
+        if os.environ.get('SNAP'):
+            # No pkexec or setuid inside the confined snap: user changes only
+            changes = [c for c in changes if c['scope'] == 'user']
+        self.tuning_changes = changes
+        parts = []
+        memory = profile.get('memory') or {}
+        if memory.get('total_kb'):
+            parts.append(f"{memory['total_kb'] / (1024 * 1024):.1f} Go de RAM")
+        cpu = profile.get('cpu') or {}
+        if cpu:
+            parts.append(f"{cpu['cores']} cœurs")
+        for dev in profile.get('storage') or []:
+            if not dev['removable']:
+                parts.append(f"{dev['name']} : {dev['kind'].upper()}")
+        gpu = profile.get('gpu') or []
+        parts.append("pilote graphique : " + (", ".join(gpu) if gpu else "aucun"))
+        self.tuning_summary.set_text(" · ".join(parts))
+
+        for change in changes:
+            check = Gtk.CheckButton.new_with_label(change['description'])
+            check.set_active(True)
+            check.change = change
+            self.tuning_checks.append(check)
+            self.tuning_box.pack_start(check, False, False, 0)
+        self.tuning_box.show_all()
+
+        if changes:
+            self.tuning_apply_btn.set_sensitive(True)
+        else:
+            self.tuning_status.set_text("Aucune optimisation nécessaire pour cet ordinateur.")
+        return False
+
+    def on_tuning_apply(self, widget):
+        ids = {c.change['id'] for c in self.tuning_checks if c.get_active()}
+        selected = karmaos_tuning.select(self.tuning_changes, ids, self.tuning_profile)
+        for check in self.tuning_checks:
+            check.set_sensitive(False)
+        self.tuning_apply_btn.set_sensitive(False)
+        self.tuning_skip_btn.set_sensitive(False)
+        self.tuning_status.set_markup('<span foreground="gray">Application des optimisations...</span>')
+        threading.Thread(target=self._apply_tuning, args=(selected,), daemon=True).start()
+
+    def _apply_tuning(self, selected):
+        """Apply user changes in-process and system changes through pkexec.
+
+        The privileged helper gets the confirmed changes themselves, so it
+        applies exactly what was shown rather than planning again as root.
+        """
+        _applied, errors = karmaos_tuning.apply(selected, 'user')
+        system = [c for c in selected if c['scope'] == 'system']
+        if system:
+            cmd = ["pkexec", sys.executable, karmaos_tuning.__file__,
+                   "apply", "--scope", "system", "--changes", "-"]
+            try:
+                ret = subprocess.run(cmd, input=json.dumps(system), capture_output=True,
+                                     text=True, timeout=300)
+                if ret.returncode != 0:
+                    errors.append(ret.stderr.strip() or ret.stdout.strip() or f"pkexec: {ret.returncode}")
+            except Exception as e:
+                errors.append(str(e))
+        GLib.idle_add(self._on_tuning_applied, errors)
+
+    def _on_tuning_applied(self, errors):
+        if errors:
+            details = GLib.markup_escape_text("\n".join(errors))
+            self.tuning_status.set_markup(
+                '<span foreground="orange">⚠ Certaines optimisations n\'ont pas pu être appliquées :\n'
+                f'{details}</span>')
+        elif shutil.which('karmaos-tuning'):
+            self.tuning_status.set_markup(
+                '<span foreground="green">✓ Optimisations appliquées.</span>\n'
+                '<span size="small">Pour les annuler : karmaos-tuning revert --scope system '
+                'et karmaos-tuning revert --scope user</span>')
+        else:
+            # The revert command only ships with the KarmaOS install, not the snap
+            self.tuning_status.set_markup('<span foreground="green">✓ Optimisations appliquées.</span>')
+        self.tuning_skip_btn.set_label("Terminer")
+        self.tuning_skip_btn.set_sensitive(True)
+        return False
+
     # ─────────────────────────────────────────────────────────────
     # Helpers
     # ─────────────────────────────────────────────────────────────
@@ -482,6 +963,7 @@ class KarmaOSWelcome(Gtk.Window):
         self.current_page -= 1
         self.notebook.set_current_page(self.current_page)
 
+    @instrument
     def show_error(self, message):
         dialog = Gtk.MessageDialog(
             parent=self,
@@ -498,7 +980,27 @@ def main():
     win = KarmaOSWelcome()
     win.connect("destroy", Gtk.main_quit)
     win.show_all()
+    # Debug/benchmark helper: open the wizard directly on a given page, then
+    # visit the next ones every KARMAOS_WELCOME_PAGE_DELAY seconds ("5,4")
+    def show_page(page):
+        win.current_page = page
+        win.notebook.set_current_page(page)
+        return False
+    pages = [int(p) for p in os.environ.get('KARMAOS_WELCOME_PAGE', '').split(',') if p.strip().isdigit()]
+    delay_ms = int(float(os.environ.get('KARMAOS_WELCOME_PAGE_DELAY', '3')) * 1000)
+    for i, page in enumerate(pages):
+        if i == 0:
+            show_page(page)
+        else:
+            GLib.timeout_add(delay_ms * i, show_page, page)
+    # Benchmark helper: quit once the first frame is on screen (cold start timing)
+    if os.environ.get('KARMAOS_WELCOME_EXIT_AFTER_START') == '1':
+        win.connect_after("draw", lambda w, cr: GLib.idle_add(Gtk.main_quit) and False)
+    # Opt-in stall detector, see karmaos_watchdog
+    watchdog = karmaos_watchdog.start_from_env()
     Gtk.main()
+    if watchdog:
+        watchdog.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,170 @@
+"""
+KarmaOS Welcome - Hardware detection helpers
+Cheap /proc and /sys probes used to adapt the wizard to the machine
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Below this much RAM the wizard avoids WebKit entirely
+LOW_MEMORY_KB = 3 * 1024 * 1024
+
+PROFILE_LOW = 'low'
+PROFILE_STANDARD = 'standard'
+
+
+def read_meminfo(path='/proc/meminfo'):
+    """Return /proc/meminfo as a dict of kB values."""
+    info = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                fields = value.split()
+                if fields and fields[0].isdigit():
+                    info[key] = int(fields[0])
+    except OSError:
+        pass
+    return info
+
+
+def memory_profile(meminfo=None) -> str:
+    """Pick the wizard memory profile; KARMAOS_WELCOME_MEMORY_PROFILE overrides it."""
+    forced = os.environ.get('KARMAOS_WELCOME_MEMORY_PROFILE')
+    if forced in (PROFILE_LOW, PROFILE_STANDARD):
+        return forced
+    if meminfo is None:
+        meminfo = read_meminfo()
+    total = meminfo.get('MemTotal', 0)
+    if total and total < LOW_MEMORY_KB:
+        return PROFILE_LOW
+    return PROFILE_STANDARD
+
+
+# ─────────────────────────────────────────────────────────────
+# Machine profile (installed mode tuning)
+# ─────────────────────────────────────────────────────────────
+PROFILE_TIMEOUT = 1.0
+SKIPPED_BLOCK_PREFIXES = ('loop', 'ram', 'zram', 'sr', 'dm-', 'md', 'nbd', 'fd')
+# Where casper mounts the medium the live session booted from
+LIVE_MEDIUM_MOUNTS = ('/cdrom', '/run/live/medium', '/run/casper/medium')
+
+
+def _read(path, default=''):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+
+def probe_cpu():
+    model = ''
+    for line in _read('/proc/cpuinfo').splitlines():
+        if line.startswith('model name'):
+            model = line.partition(':')[2].strip()
+            break
+    return {'cores': os.cpu_count() or 1, 'model': model}
+
+
+def probe_memory():
+    info = read_meminfo()
+    return {'total_kb': info.get('MemTotal', 0), 'swap_kb': info.get('SwapTotal', 0)}
+
+
+def storage_kind(name, rotational):
+    """Classify a block device as 'hdd', 'ssd', 'nvme' or 'emmc'."""
+    if name.startswith('mmcblk'):
+        return 'emmc'
+    if name.startswith('nvme'):
+        return 'nvme'
+    return 'hdd' if rotational == '1' else 'ssd'
+
+
+def probe_storage(sys_block='/sys/block'):
+    devices = []
+    try:
+        names = sorted(os.listdir(sys_block))
+    except OSError:
+        return devices
+    for name in names:
+        if name.startswith(SKIPPED_BLOCK_PREFIXES):
+            continue
+        queue = os.path.join(sys_block, name, 'queue')
+        schedulers = _read(os.path.join(queue, 'scheduler')).split()
+        current = next((s.strip('[]') for s in schedulers if s.startswith('[')), '')
+        devices.append({
+            'name': name,
+            'kind': storage_kind(name, _read(os.path.join(queue, 'rotational'), '0')),
+            'removable': _read(os.path.join(sys_block, name, 'removable'), '0') == '1',
+            'size_bytes': int(_read(os.path.join(sys_block, name, 'size'), '0') or 0) * 512,
+            'schedulers': [s.strip('[]') for s in schedulers],
+            'scheduler': current,
+        })
+    return devices
+
+
+def boot_medium(mounts='/proc/mounts', sys_class_block='/sys/class/block'):
+    """Name of the disk the live session booted from (e.g. 'sdb'), or None."""
+    try:
+        with open(mounts, 'r', encoding='utf-8') as f:
+            entries = [line.split()[:2] for line in f]
+    except OSError:
+        return None
+    for source, target in entries:
+        if target in LIVE_MEDIUM_MOUNTS and source.startswith('/dev/'):
+            name = os.path.basename(os.path.realpath(source))
+            # A partition's sysfs entry sits in its disk's directory
+            node = os.path.realpath(os.path.join(sys_class_block, name))
+            if os.path.exists(os.path.join(node, 'partition')):
+                name = os.path.basename(os.path.dirname(node))
+            return name
+    return None
+
+
+def install_targets(storage=None):
+    """Disks an installation can go to: neither removable nor the boot medium."""
+    if storage is None:
+        storage = probe_storage()
+    medium = boot_medium()
+    return [d for d in storage if not d['removable'] and d['name'] != medium]
+
+
+def probe_gpu(sys_drm='/sys/class/drm'):
+    drivers = []
+    try:
+        cards = sorted(c for c in os.listdir(sys_drm) if c.startswith('card') and '-' not in c)
+    except OSError:
+        return drivers
+    for card in cards:
+        link = os.path.join(sys_drm, card, 'device', 'driver')
+        if os.path.islink(link):
+            driver = os.path.basename(os.readlink(link))
+            if driver not in drivers:
+                drivers.append(driver)
+    return drivers
+
+
+def profile_machine(timeout=PROFILE_TIMEOUT):
+    """Probe CPU, memory, storage and GPU in parallel.
+
+    Returns a JSON-serialisable dict; probes still running after `timeout`
+    seconds are reported as None rather than delaying the caller.
+    """
+    started = time.monotonic()
+    probes = {'cpu': probe_cpu, 'memory': probe_memory,
+              'storage': probe_storage, 'gpu': probe_gpu}
+    pool = ThreadPoolExecutor(max_workers=len(probes))
+    futures = {key: pool.submit(func) for key, func in probes.items()}
+    wait(futures.values(), timeout=timeout)
+    pool.shutdown(wait=False)
+
+    profile = {}
+    for key, future in futures.items():
+        try:
+            profile[key] = future.result(timeout=0) if future.done() else None
+        except Exception:
+            profile[key] = None
+    profile['elapsed_ms'] = int((time.monotonic() - started) * 1000)
+    return profile
@@ -0,0 +1,316 @@
+"""
+KarmaOS Welcome - NetworkManager Wi-Fi client
+Asynchronous access point cache fed by NetworkManager D-Bus signals
+
+The client only talks to D-Bus through Gio, so it can be pointed at a
+python-dbusmock NetworkManager by passing its connection as `bus`.
+"""
+
+from collections import namedtuple
+
+from gi.repository import Gio, GLib
+
+NM_BUS_NAME = 'org.freedesktop.NetworkManager'
+NM_PATH = '/org/freedesktop/NetworkManager'
+NM_IFACE = 'org.freedesktop.NetworkManager'
+NM_DEVICE_IFACE = 'org.freedesktop.NetworkManager.Device'
+NM_WIRELESS_IFACE = 'org.freedesktop.NetworkManager.Device.Wireless'
+NM_AP_IFACE = 'org.freedesktop.NetworkManager.AccessPoint'
+DBUS_PROPS_IFACE = 'org.freedesktop.DBus.Properties'
+
+NM_DEVICE_TYPE_WIFI = 2
+NM_802_11_AP_FLAGS_PRIVACY = 0x1
+NM_802_11_AP_SEC_KEY_MGMT_PSK = 0x100
+NM_802_11_AP_SEC_KEY_MGMT_802_1X = 0x200
+NM_802_11_AP_SEC_KEY_MGMT_SAE = 0x400
+NM_802_11_AP_SEC_KEY_MGMT_OWE = 0x800
+
+# Signal bursts are coalesced and applied at most once per interval
+FLUSH_INTERVAL_MS = 400
+# Strength drifts smaller than this are not reported as changes
+STRENGTH_STEP = 10
+CALL_TIMEOUT_MS = 5000
+
+# ssid: str, strength: 0-100, security: '' (open), 'WEP', 'WPA', 'WPA2', 'WPA3', '802.1X'
+Network = namedtuple('Network', ['ssid', 'strength', 'security'])
+AccessPoint = namedtuple('AccessPoint', ['device', 'ssid', 'raw_ssid', 'strength', 'security',
+                                         'key_mgmt'])
+
+
+def ap_security(flags: int, wpa_flags: int, rsn_flags: int) -> str:
+    """Map NetworkManager AP flags to a short security label."""
+    key_mgmt = wpa_flags | rsn_flags
+    if key_mgmt & NM_802_11_AP_SEC_KEY_MGMT_802_1X:
+        return '802.1X'
+    if rsn_flags & NM_802_11_AP_SEC_KEY_MGMT_SAE:
+        return 'WPA3'
+    if rsn_flags & NM_802_11_AP_SEC_KEY_MGMT_PSK:
+        return 'WPA2'
+    if wpa_flags & NM_802_11_AP_SEC_KEY_MGMT_PSK:
+        return 'WPA'
+    if key_mgmt & NM_802_11_AP_SEC_KEY_MGMT_OWE:
+        return ''
+    if flags & NM_802_11_AP_FLAGS_PRIVACY:
+        return 'WEP'
+    return ''
+
+
+def ap_key_mgmt(wpa_flags: int, rsn_flags: int) -> str:
+    """NetworkManager key-mgmt to connect with a password.
+
+    PSK wins whenever the AP offers it: WPA2/WPA3 transition-mode networks then
+    also work with older Wi-Fi chips that cannot do SAE.
+    """
+    key_mgmt = wpa_flags | rsn_flags
+    if key_mgmt & NM_802_11_AP_SEC_KEY_MGMT_PSK:
+        return 'wpa-psk'
+    if key_mgmt & NM_802_11_AP_SEC_KEY_MGMT_SAE:
+        return 'sae'
+    return ''
+
+
+class WifiScanner:
+    """Cache of visible Wi-Fi networks, reported to `on_diff` as batched diffs.
+
+    `on_diff(added, removed, changed)` receives lists of `Network` tuples
+    (`removed` only needs `.ssid`). Access points sharing an SSID are merged
+    and reported with the strongest signal.
+    """
+
+    def __init__(self, on_diff, bus=None, flush_interval=FLUSH_INTERVAL_MS):
+        self.on_diff = on_diff
+        self.bus = bus
+        self.flush_interval = flush_interval
+        self.available = False
+        self._devices = set()
+        self._aps = {}          # AP object path -> AccessPoint
+        self._shown = {}        # ssid -> Network last reported to on_diff
+        self._subscriptions = []
+        self._flush_id = 0
+
+    # ─────────────────────────────────────────────────────────────
+    # Lifecycle
+    # ─────────────────────────────────────────────────────────────
+    def start(self):
+        if self.bus is None:
+            Gio.bus_get(Gio.BusType.SYSTEM, None, self._on_bus_ready)
+        else:
+            self._setup()
+
+    def stop(self):
+        for sub_id in self._subscriptions:
+            self.bus.signal_unsubscribe(sub_id)
+        self._subscriptions = []
+        if self._flush_id:
+            GLib.source_remove(self._flush_id)
+            self._flush_id = 0
+
+    def _on_bus_ready(self, source, result):
+        try:
+            self.bus = Gio.bus_get_finish(result)
+        except GLib.Error:
+            return
+        self._setup()
+
+    def _setup(self):
+        subscribe = self.bus.signal_subscribe
+        flags = Gio.DBusSignalFlags.NONE
+        self._subscriptions = [
+            subscribe(NM_BUS_NAME, NM_IFACE, 'DeviceAdded', NM_PATH, None, flags,
+                      self._on_device_added),
+            subscribe(NM_BUS_NAME, NM_IFACE, 'DeviceRemoved', NM_PATH, None, flags,
+                      self._on_device_removed),
+            subscribe(NM_BUS_NAME, NM_WIRELESS_IFACE, 'AccessPointAdded', None, None, flags,
+                      self._on_ap_added),
+            subscribe(NM_BUS_NAME, NM_WIRELESS_IFACE, 'AccessPointRemoved', None, None, flags,
+                      self._on_ap_removed),
+            subscribe(NM_BUS_NAME, DBUS_PROPS_IFACE, 'PropertiesChanged', None, NM_AP_IFACE,
+                      flags, self._on_ap_properties_changed),
+        ]
+        self._call(NM_PATH, NM_IFACE, 'GetDevices', None, self._on_devices)
+
+    # ─────────────────────────────────────────────────────────────
+    # Public actions
+    # ─────────────────────────────────────────────────────────────
+    def request_scan(self):
+        """Ask every Wi-Fi device to rescan; results arrive as signals."""
+        for device in self._devices:
+            self._call(device, NM_WIRELESS_IFACE, 'RequestScan',
+                       GLib.Variant('(a{sv})', ({},)), None)
+
+    def connect_to(self, ssid, password=None, callback=None):
+        """Create and activate a connection to the strongest AP named `ssid`.
+
+        `callback(ok, message)` is called from the main loop when NetworkManager answers.
+        """
+        candidates = [(ap.strength, path, ap) for path, ap in self._aps.items() if ap.ssid == ssid]
+        if not candidates:
+            if callback:
+                callback(False, "Réseau introuvable")
+            return
+        _strength, ap_path, ap = max(candidates)
+
+        settings = {'802-11-wireless': {'ssid': GLib.Variant('ay', ap.raw_ssid)}}
+        if ap.security in ('WPA', 'WPA2', 'WPA3'):
+            settings['802-11-wireless-security'] = {
+                'key-mgmt': GLib.Variant('s', ap.key_mgmt or 'wpa-psk'),
+                'psk': GLib.Variant('s', password or ''),
+            }
+        elif ap.security == 'WEP':
+            settings['802-11-wireless-security'] = {
+                'key-mgmt': GLib.Variant('s', 'none'),
+                'wep-key0': GLib.Variant('s', password or ''),
+            }
+
+        def on_reply(reply, error):
+            if callback:
+                callback(error is None, error.message if error else "")
+
+        self._call(NM_PATH, NM_IFACE, 'AddAndActivateConnection',
+                   GLib.Variant('(a{sa{sv}}oo)', (settings, ap.device, ap_path)), on_reply)
+
+    def networks(self):
+        """Current merged view, strongest first."""
+        return sorted(self._merged().values(), key=lambda n: -n.strength)
+
+    # ─────────────────────────────────────────────────────────────
+    # D-Bus plumbing
+    # ─────────────────────────────────────────────────────────────
+    def _call(self, path, iface, method, params, callback):
+        def on_done(bus, result, _data):
+            try:
+                reply = bus.call_finish(result)
+            except GLib.Error as e:
+                if callback:
+                    callback(None, e)
+                return
+            if callback:
+                callback(reply.unpack(), None)
+
+        self.bus.call(NM_BUS_NAME, path, iface, method, params, None,
+                      Gio.DBusCallFlags.NONE, CALL_TIMEOUT_MS, None, on_done, None)
+
+    def _on_devices(self, reply, error):
+        if error:
+            return
+        self.available = True
+        for device in reply[0]:
+            self._probe_device(device)
+
+    def _probe_device(self, device):
+        def on_type(reply, error):
+            if error or reply[0] != NM_DEVICE_TYPE_WIFI:
+                return
+            self._devices.add(device)
+            self._call(device, NM_WIRELESS_IFACE, 'GetAllAccessPoints', None, on_aps)
+            self._call(device, NM_WIRELESS_IFACE, 'RequestScan',
+                       GLib.Variant('(a{sv})', ({},)), None)
+
+        def on_aps(reply, error):
+            if error:
+                return
+            for ap_path in reply[0]:
+                self._load_ap(device, ap_path)
+
+        self._call(device, DBUS_PROPS_IFACE, 'Get',
+                   GLib.Variant('(ss)', (NM_DEVICE_IFACE, 'DeviceType')), on_type)
+
+    def _load_ap(self, device, ap_path):
+        def on_props(reply, error):
+            if error or device not in self._devices:
+                return
+            self._store_ap(device, ap_path, reply[0])
+
+        self._call(ap_path, DBUS_PROPS_IFACE, 'GetAll',
+                   GLib.Variant('(s)', (NM_AP_IFACE,)), on_props)
+
+    def _store_ap(self, device, ap_path, props):
+        raw_ssid = bytes(props.get('Ssid', b''))
+        if not raw_ssid:
+            # Hidden network: nothing the user could pick from a list
+            return
+        wpa_flags = int(props.get('WpaFlags', 0))
+        rsn_flags = int(props.get('RsnFlags', 0))
+        self._aps[ap_path] = AccessPoint(
+            device=device,
+            ssid=raw_ssid.decode('utf-8', 'replace'),
+            raw_ssid=raw_ssid,
+            strength=int(props.get('Strength', 0)),
+            security=ap_security(int(props.get('Flags', 0)), wpa_flags, rsn_flags),
+            key_mgmt=ap_key_mgmt(wpa_flags, rsn_flags),
+        )
+        self._schedule_flush()
+
+    # ─────────────────────────────────────────────────────────────
+    # Signal handlers
+    # ─────────────────────────────────────────────────────────────
+    def _on_device_added(self, bus, sender, path, iface, signal, params):
+        self._probe_device(params.unpack()[0])
+
+    def _on_device_removed(self, bus, sender, path, iface, signal, params):
+        device = params.unpack()[0]
+        if device in self._devices:
+            self._devices.discard(device)
+            for ap_path in [p for p, ap in self._aps.items() if ap.device == device]:
+                del self._aps[ap_path]
+            self._schedule_flush()
+
+    def _on_ap_added(self, bus, sender, path, iface, signal, params):
+        if path in self._devices:
+            self._load_ap(path, params.unpack()[0])
+
+    def _on_ap_removed(self, bus, sender, path, iface, signal, params):
+        if self._aps.pop(params.unpack()[0], None) is not None:
+            self._schedule_flush()
+
+    def _on_ap_properties_changed(self, bus, sender, path, iface, signal, params):
+        ap = self._aps.get(path)
+        if ap is None:
+            return
+        _iface, changed, _invalidated = params.unpack()
+        if changed.keys() & {'Ssid', 'Flags', 'WpaFlags', 'RsnFlags'}:
+            # Rare; simply reload the whole AP
+            self._load_ap(ap.device, path)
+        elif 'Strength' in changed:
+            self._aps[path] = ap._replace(strength=int(changed['Strength']))
+            self._schedule_flush()
+
+    # ─────────────────────────────────────────────────────────────
+    # Throttled diffing
+    # ─────────────────────────────────────────────────────────────
+    def _merged(self):
+        merged = {}
+        for ap in self._aps.values():
+            best = merged.get(ap.ssid)
+            if best is None or ap.strength > best.strength:
+                merged[ap.ssid] = Network(ap.ssid, ap.strength, ap.security)
+        return merged
+
+    def _schedule_flush(self):
+        if not self._flush_id:
+            self._flush_id = GLib.timeout_add(self.flush_interval, self._flush)
+
+    def _flush(self):
+        self._flush_id = 0
+        current = self._merged()
+        added, removed, changed = [], [], []
+
+        for ssid, net in current.items():
+            shown = self._shown.get(ssid)
+            if shown is None:
+                added.append(net)
+            elif (net.security != shown.security
+                  or abs(net.strength - shown.strength) >= STRENGTH_STEP):
+                changed.append(net)
+        for ssid, shown in self._shown.items():
+            if ssid not in current:
+                removed.append(shown)
+
+        for net in added + changed:
+            self._shown[net.ssid] = net
+        for net in removed:
+            del self._shown[net.ssid]
+
+        if added or removed or changed:
+            self.on_diff(added, removed, changed)
+        return False
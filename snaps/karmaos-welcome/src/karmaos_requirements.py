@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+KarmaOS Welcome - Installation requirements probe
+Checks disk size, RAM, AC power, firmware, Secure Boot and connectivity in
+parallel and caches the result for the wizard and the installer launcher.
+
+    karmaos_requirements.py [--cache PATH] [--max-age S] [--refresh CHECK ...]
+    karmaos_requirements.py --no-probe --calamares-conf /etc/calamares/modules/welcome.conf
+
+The second form rewrites Calamares' welcome.conf so that it only repeats the
+checks the cached probe did not already pass.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from karmaos_hardware import install_targets, read_meminfo
+
+REQUIRED_STORAGE_GB = 10.0
+REQUIRED_RAM_GB = 1.0
+CONNECTIVITY_URL = os.environ.get('KARMAOS_CONNECTIVITY_URL',
+                                  'http://connectivity-check.ubuntu.com/')
+# What CONNECTIVITY_URL answers when nothing sits in between (captive portal, proxy page)
+CONNECTIVITY_STATUS = int(os.environ.get('KARMAOS_CONNECTIVITY_STATUS', '204'))
+INTERNET_TIMEOUT = 3.0
+PROBE_TIMEOUT = 4.0
+CACHE_MAX_AGE = 900
+
+EFI_DIR = '/sys/firmware/efi'
+SECURE_BOOT_VAR = '/sys/firmware/efi/efivars/SecureBoot-8be4df61-93ca-11d2-aa0d-00e098032b8c'
+POWER_SUPPLY_DIR = '/sys/class/power_supply'
+
+# Calamares welcome module checks we can answer for it, and which of them block
+CALAMARES_CHECKS = ('storage', 'ram', 'power', 'internet', 'root')
+CALAMARES_REQUIRED = ('storage', 'ram', 'root')
+
+
+def _read(path, default=''):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+
+def _gib(value_bytes):
+    return round(value_bytes / 1024 ** 3, 1)
+
+
+def check_storage():
+    # The live USB and other removable media are not install targets
+    sizes = [d['size_bytes'] for d in install_targets()]
+    largest = max(sizes, default=0)
+    return {'ok': largest >= REQUIRED_STORAGE_GB * 1024 ** 3,
+            'value': _gib(largest), 'required': REQUIRED_STORAGE_GB}
+
+
+def check_ram():
+    total = read_meminfo().get('MemTotal', 0) * 1024
+    # MemTotal excludes memory reserved by the kernel; allow for it like Calamares does
+    return {'ok': total >= REQUIRED_RAM_GB * 1024 ** 3 * 0.95,
+            'value': _gib(total), 'required': REQUIRED_RAM_GB}
+
+
+def check_power():
+    """On AC, or a machine without a battery."""
+    mains, battery = [], False
+    try:
+        supplies = os.listdir(POWER_SUPPLY_DIR)
+    except OSError:
+        supplies = []
+    for name in supplies:
+        path = os.path.join(POWER_SUPPLY_DIR, name)
+        kind = _read(os.path.join(path, 'type'))
+        if kind == 'Mains':
+            mains.append(_read(os.path.join(path, 'online')) == '1')
+        elif kind == 'Battery' and _read(os.path.join(path, 'scope')) != 'Device':
+            battery = True
+    on_ac = any(mains) or not battery
+    return {'ok': on_ac, 'value': 'ac' if on_ac else 'battery'}
+
+
+def check_firmware():
+    return {'ok': True, 'value': 'efi' if os.path.isdir(EFI_DIR) else 'bios'}
+
+
+def check_secure_boot():
+    try:
+        with open(SECURE_BOOT_VAR, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return {'ok': True, 'value': None}
+    # 4 bytes of attributes, then the variable itself
+    return {'ok': True, 'value': len(data) > 4 and data[4] == 1}
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None     # A redirect is a captive portal, not the check answering
+
+
+_opener = urllib.request.build_opener(_NoRedirect)
+
+
+def check_internet(url=None, timeout=INTERNET_TIMEOUT, expected_status=None):
+    request = urllib.request.Request(url or CONNECTIVITY_URL)
+    try:
+        with _opener.open(request, timeout=timeout) as response:
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (OSError, ValueError):
+        return {'ok': False, 'value': False}
+    online = status == (expected_status or CONNECTIVITY_STATUS)
+    return {'ok': online, 'value': online}
+
+
+CHECKS = {
+    'storage': check_storage,
+    'ram': check_ram,
+    'power': check_power,
+    'firmware': check_firmware,
+    'secure_boot': check_secure_boot,
+    'internet': check_internet,
+}
+
+
+def probe(only=None, timeout=PROBE_TIMEOUT):
+    """Run the checks in parallel; checks still running after `timeout` are None."""
+    started = time.monotonic()
+    names = [name for name in CHECKS if only is None or name in only]
+    pool = ThreadPoolExecutor(max_workers=max(1, len(names)))
+    futures = {name: pool.submit(CHECKS[name]) for name in names}
+    wait(futures.values(), timeout=timeout)
+    pool.shutdown(wait=False)
+
+    now = time.time()
+    checks = {}
+    for name, future in futures.items():
+        try:
+            result = future.result(timeout=0) if future.done() else None
+        except Exception:
+            result = None
+        if result is not None:
+            result['checked_at'] = now
+        checks[name] = result
+    return {'checks': checks, 'elapsed_ms': int((time.monotonic() - started) * 1000)}
+
+
+def default_cache_path():
+    base = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(base, 'karmaos-requirements.json')
+
+
+def load_cache(path=None):
+    try:
+        with open(path or default_cache_path(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'checks': {}}
+
+
+def _fresh(result, max_age, now):
+    return bool(result) and now - result.get('checked_at', 0) <= max_age
+
+
+def probe_cached(path=None, max_age=CACHE_MAX_AGE, refresh=()):
+    """Return cached results, re-running only expired, missing or `refresh` checks."""
+    path = path or default_cache_path()
+    cached = load_cache(path)
+    now = time.time()
+    stale = [name for name in CHECKS
+             if name in refresh or not _fresh(cached['checks'].get(name), max_age, now)]
+    result = {'checks': dict(cached['checks']), 'elapsed_ms': 0}
+    if stale:
+        fresh = probe(only=stale)
+        # A check that timed out keeps its previous answer rather than losing it
+        result['checks'].update({k: v for k, v in fresh['checks'].items() if v is not None})
+        result['elapsed_ms'] = fresh['elapsed_ms']
+        _write_cache(path, result)
+    return result
+
+
+def _write_cache(path, result):
+    directory = os.path.dirname(path) or '.'
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def blocking_failures(result):
+    """Names of failed checks that Calamares would refuse to install with."""
+    return [name for name in CALAMARES_REQUIRED
+            if (result['checks'].get(name) or {}).get('ok') is False]
+
+
+def calamares_conf(result=None, max_age=CACHE_MAX_AGE):
+    """Calamares welcome.conf, leaving out checks the probe already passed."""
+    now = time.time()
+    passed = set()
+    for name, check in ((result or {}).get('checks') or {}).items():
+        if _fresh(check, max_age, now) and check.get('ok'):
+            passed.add(name)
+    check = [name for name in CALAMARES_CHECKS if name not in passed]
+    required = [name for name in CALAMARES_REQUIRED if name in check]
+    lines = [
+        '---',
+        'showSupportUrl: true',
+        'showKnownIssuesUrl: false',
+        'showReleaseNotesUrl: false',
+        'requirements:',
+        f'  requiredStorage: {REQUIRED_STORAGE_GB}',
+        f'  requiredRam: {REQUIRED_RAM_GB}',
+        f'  internetCheckUrl: {CONNECTIVITY_URL}',
+        '  check:',
+        *[f'    - {name}' for name in check],
+        '  required:',
+        *[f'    - {name}' for name in required],
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='KarmaOS installation requirements probe')
+    parser.add_argument('--cache', default=None, help='Cache file (default: $XDG_RUNTIME_DIR)')
+    parser.add_argument('--max-age', type=int, default=CACHE_MAX_AGE)
+    parser.add_argument('--refresh', nargs='*', default=(), choices=sorted(CHECKS))
+    parser.add_argument('--no-probe', action='store_true', help='Only read the cache')
+    parser.add_argument('--calamares-conf', metavar='PATH',
+                        help='Write a Calamares welcome.conf (- for stdout) instead of printing JSON')
+    args = parser.parse_args(argv)
+
+    if args.no_probe:
+        result = load_cache(args.cache)
+    else:
+        result = probe_cached(args.cache, args.max_age, args.refresh)
+
+    if args.calamares_conf == '-':
+        sys.stdout.write(calamares_conf(result, args.max_age))
+    elif args.calamares_conf:
+        with open(args.calamares_conf, 'w', encoding='utf-8') as f:
+            f.write(calamares_conf(result, args.max_age))
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    return 1 if blocking_failures(result) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
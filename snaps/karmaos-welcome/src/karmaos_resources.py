@@ -0,0 +1,144 @@
+"""
+KarmaOS Welcome - Offline-first resources page cache
+Serves the bundled snapshot or the last cached copy, refreshed with conditional requests
+"""
+
+import json
+import os
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from html.parser import HTMLParser
+
+RESOURCES_URL = os.environ.get('KARMAOS_WELCOME_RESOURCES_URL',
+                               'https://karmaos.ovh/karmaos-welcome/')
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+USER_AGENT = 'karmaos-welcome/26.01'
+
+
+class _LinkParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.links = []
+        self._href = None
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            self._href = dict(attrs).get('href')
+            self._text = []
+
+    def handle_data(self, data):
+        if self._href is not None:
+            self._text.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == 'a' and self._href is not None:
+            text = ' '.join(''.join(self._text).split())
+            if self._href.startswith(('http://', 'https://')):
+                self.links.append((text or self._href, self._href))
+            self._href = None
+
+
+def page_links(html):
+    """Return the absolute `(text, href)` links of a page, for the native fallback."""
+    parser = _LinkParser()
+    parser.feed(html or '')
+    parser.close()
+    return parser.links
+
+
+def default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'karmaos-welcome', 'resources')
+
+
+class ResourceCache:
+    """One cached HTML document with its HTTP validators.
+
+    Layout of `cache_dir`: `page.html` (body) and `page.json`
+    (`url`, `etag`, `last_modified`, `checked_at`).
+    """
+
+    def __init__(self, snapshot_path, url=RESOURCES_URL, cache_dir=None, timeout=10):
+        self.snapshot_path = snapshot_path
+        self.url = url
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.timeout = timeout
+        self.page_path = os.path.join(self.cache_dir, 'page.html')
+        self.meta_path = os.path.join(self.cache_dir, 'page.json')
+
+    def load(self):
+        """Return `(html, checked_at)`; `checked_at` is None for the bundled snapshot."""
+        meta = self._read_meta()
+        if meta.get('url') == self.url:
+            try:
+                with open(self.page_path, 'r', encoding='utf-8') as f:
+                    return f.read(), meta.get('checked_at')
+            except OSError:
+                pass
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                return f.read(), None
+        except OSError:
+            return None, None
+
+    def refresh(self):
+        """Revalidate the cached copy; return True when new content was stored.
+
+        Blocking: call it from a worker thread. Network errors are raised.
+        """
+        meta = self._read_meta()
+        have_copy = meta.get('url') == self.url and os.path.exists(self.page_path)
+
+        request = urllib.request.Request(self.url, headers={'User-Agent': USER_AGENT})
+        if have_copy:
+            if meta.get('etag'):
+                request.add_header('If-None-Match', meta['etag'])
+            if meta.get('last_modified'):
+                request.add_header('If-Modified-Since', meta['last_modified'])
+
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = response.read(MAX_PAGE_BYTES + 1)
+                headers = response.headers
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and have_copy:
+                meta['checked_at'] = time.time()
+                self._write(self.meta_path, json.dumps(meta).encode('utf-8'))
+                return False
+            raise
+
+        if len(body) > MAX_PAGE_BYTES:
+            raise ValueError(f"{self.url}: page larger than {MAX_PAGE_BYTES} bytes")
+        charset = headers.get_content_charset() or 'utf-8'
+        html = body.decode(charset, 'replace')
+
+        self._write(self.page_path, html.encode('utf-8'))
+        self._write(self.meta_path, json.dumps({
+            'url': self.url,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'checked_at': time.time(),
+        }).encode('utf-8'))
+        return True
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, path, data):
+        """Atomically replace `path` so a crash never leaves a torn page."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
@@ -0,0 +1,217 @@
+"""
+KarmaOS Welcome - snapd refresh coordination
+Holds automatic snap refreshes during setup and the first session, until a later window
+
+The hold is snapd's `refresh.hold` timestamp, so snapd itself releases it
+when the window opens even if the wizard crashes or is never started again.
+"""
+
+import datetime
+import http.client
+import json
+import os
+import socket
+import tempfile
+import time
+import urllib.parse
+
+SNAPD_SOCKET = '/run/snapd.socket'
+# Refreshes are deferred to this window (local time); karmaos_tuning uses it for refresh.timer
+REFRESH_WINDOW = '02:00-05:00'
+# Never schedule the window closer than this to now
+MIN_HOLD = datetime.timedelta(hours=2)
+CHANGE_POLL_INTERVAL = 0.5
+
+
+class SnapdError(Exception):
+    def __init__(self, status, message, kind=''):
+        super().__init__(f"snapd {status}: {message}")
+        self.status = status
+        self.kind = kind
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+def snapd_request(method, path, body=None, interactive=False,
+                  socket_path=SNAPD_SOCKET, timeout=30, wait=True):
+    """Call the snapd REST API.
+
+    Async operations are waited for; with `wait=False` their change id is
+    returned instead, for changes that can run for minutes (refreshes).
+    """
+    headers = {}
+    payload = None
+    if body is not None:
+        payload = json.dumps(body)
+        headers['Content-Type'] = 'application/json'
+    if interactive:
+        # Lets polkit ask for a password instead of refusing outright
+        headers['X-Allow-Interaction'] = 'true'
+
+    conn = _UnixHTTPConnection(socket_path, timeout)
+    try:
+        conn.request(method, path, body=payload, headers=headers)
+        response = conn.getresponse()
+        data = json.loads(response.read() or b'{}')
+    finally:
+        conn.close()
+
+    if data.get('type') == 'error' or response.status >= 400:
+        result = data.get('result') or {}
+        raise SnapdError(response.status, result.get('message', ''), result.get('kind', ''))
+    if data.get('type') == 'async':
+        if not wait:
+            return data['change']
+        _wait_change(data['change'], socket_path, timeout)
+    return data.get('result')
+
+
+def _wait_change(change_id, socket_path, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        change = snapd_request('GET', f'/v2/changes/{change_id}', socket_path=socket_path)
+        if change.get('ready'):
+            if change.get('status') == 'Error':
+                raise SnapdError(500, change.get('err', 'change failed'))
+            return
+        time.sleep(CHANGE_POLL_INTERVAL)
+    raise SnapdError(504, f'change {change_id} still running after {timeout}s')
+
+
+def default_state_path():
+    base = os.environ.get('XDG_STATE_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'state')
+    return os.path.join(base, 'karmaos', 'snap-refresh-hold.json')
+
+
+class RefreshCoordinator:
+    """Owns one `refresh.hold` and remembers what it replaced.
+
+    All methods block on snapd; run them from a worker thread.
+    """
+
+    def __init__(self, window=REFRESH_WINDOW, state_path=None, request=snapd_request):
+        self.window = window
+        self.state_path = state_path or default_state_path()
+        self.request = request
+
+    def deferred_until(self, now=None):
+        """Next start of the refresh window that is at least MIN_HOLD away."""
+        now = now or datetime.datetime.now().astimezone()
+        hour, minute = (int(x) for x in self.window.split('-')[0].split(':'))
+        start = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        while start - now < MIN_HOLD:
+            start += datetime.timedelta(days=1)
+        return start
+
+    def current_hold(self):
+        try:
+            result = self.request('GET', '/v2/snaps/system/conf?keys=refresh.hold')
+        except SnapdError as e:
+            if e.kind == 'option-not-found' or e.status == 400:
+                return None
+            raise
+        return (result or {}).get('refresh.hold') or None
+
+    def hold(self, interactive=False):
+        """Hold auto-refreshes until the window; return the effective hold time.
+
+        Returns None when an existing hold is not a timestamp (e.g. "forever"):
+        it is left untouched, as is any hold that already ends later.
+        """
+        self.restore_expired()
+        previous = self.current_hold()
+        until = self.deferred_until()
+        state = self._read_state()
+        if state and state.get('until') == previous:
+            # Re-holding over our own hold: keep the value it originally replaced
+            previous = state.get('previous')
+        elif previous:
+            previous_until = _parse_time(previous)
+            if previous_until is None or previous_until >= until:
+                # Someone else holds longer than we need, or indefinitely
+                return previous_until
+
+        stamp = until.isoformat(timespec='seconds')
+        self.request('PUT', '/v2/snaps/system/conf', {'refresh.hold': stamp},
+                     interactive=interactive)
+        self._write_state({'previous': previous, 'until': stamp})
+        return until
+
+    def release(self, interactive=False):
+        """Restore the hold we replaced, unless someone changed it since."""
+        state = self._read_state()
+        if not state:
+            return
+        if self.current_hold() == state['until']:
+            self.request('PUT', '/v2/snaps/system/conf', {'refresh.hold': state['previous']},
+                         interactive=interactive)
+        os.unlink(self.state_path)
+
+    def restore_expired(self, now=None):
+        """Once our hold has ended, put back the hold it replaced if that one still applies."""
+        state = self._read_state()
+        if not state:
+            return
+        now = now or datetime.datetime.now().astimezone()
+        ours = _parse_time(state.get('until'))
+        if ours is not None and ours > now:
+            return
+        previous = state.get('previous')
+        previous_until = _parse_time(previous)
+        current = self.current_hold()
+        if previous and (previous_until is None or previous_until > now) \
+                and current in (None, state.get('until')):
+            self.request('PUT', '/v2/snaps/system/conf', {'refresh.hold': previous})
+        os.unlink(self.state_path)
+
+    def refresh_now(self, interactive=True):
+        """Start refreshing every snap; return the snapd change id.
+
+        A refresh takes minutes, so it is not waited for: snapd carries on
+        with it whatever happens to the wizard.
+        """
+        self.release(interactive=interactive)
+        return self.request('POST', '/v2/snaps', {'action': 'refresh'},
+                            interactive=interactive, wait=False)
+
+    def pending(self):
+        """Names of installed snaps with an update waiting in the store."""
+        query = urllib.parse.urlencode({'select': 'refresh'})
+        try:
+            result = self.request('GET', f'/v2/find?{query}')
+        except SnapdError:
+            return []
+        return sorted(snap['name'] for snap in result or [])
+
+    def _read_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_state(self, state):
+        directory = os.path.dirname(self.state_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_path)
+
+
+def _parse_time(value):
+    try:
+        parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo else parsed.astimezone()
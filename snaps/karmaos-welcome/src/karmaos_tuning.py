@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+KarmaOS Welcome - First-boot performance tuning
+Turns the machine profile into a reviewed set of changes; every change is journaled and reversible
+
+Usage:
+    karmaos_tuning.py profile                 print the machine profile
+    karmaos_tuning.py plan                    print the changes that would be applied
+    karmaos_tuning.py apply --scope SCOPE [--only ID,ID | --changes FILE]
+    karmaos_tuning.py revert --scope SCOPE
+
+The 'system' scope needs root (the wizard runs it through pkexec and hands it
+the changes the user confirmed with --changes -); the 'user' scope only
+touches the calling user's KDE configuration.
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from karmaos_hardware import profile_machine
+from karmaos_snapd import REFRESH_WINDOW as SNAP_REFRESH_WINDOW
+
+SYSTEM_JOURNAL = '/var/lib/karmaos/tuning/journal.json'
+ZRAM_CONF = '/etc/systemd/zram-generator.conf'
+SYSCTL_CONF = '/etc/sysctl.d/90-karmaos-tuning.conf'
+UDEV_IOSCHED_RULES = '/etc/udev/rules.d/60-karmaos-iosched.rules'
+
+# zram pays off below this amount of RAM
+ZRAM_MAX_RAM_KB = 16 * 1024 * 1024
+# "Weak" machines also get desktop effects and file indexing turned off
+WEAK_RAM_KB = 4 * 1024 * 1024
+WEAK_CPU_CORES = 2
+SOFTWARE_GPU_DRIVERS = ('simpledrm', 'simple-framebuffer', 'efifb', 'vesafb',
+                        'bochs-drm', 'cirrus', 'cirrus-qemu')
+
+IO_SCHEDULERS = {'hdd': 'bfq', 'emmc': 'bfq', 'ssd': 'mq-deadline', 'nvme': 'none'}
+
+ZRAM_CONF_CONTENT = """\
+# Managed by karmaos-tuning
+[zram0]
+zram-size = min(ram / 2, 4096)
+compression-algorithm = zstd
+"""
+
+SYSCTL_CONF_CONTENT = """\
+# Managed by karmaos-tuning: swap to zram early rather than dropping page cache
+vm.swappiness = 100
+"""
+
+
+def user_journal_path():
+    base = os.environ.get('XDG_STATE_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'state')
+    return os.path.join(base, 'karmaos', 'tuning-journal.json')
+
+
+def journal_path(scope):
+    return SYSTEM_JOURNAL if scope == 'system' else user_journal_path()
+
+
+# ─────────────────────────────────────────────────────────────
+# Planning
+# ─────────────────────────────────────────────────────────────
+def _change(change_id, scope, kind, target, value, description):
+    return {'id': change_id, 'scope': scope, 'kind': kind,
+            'target': target, 'value': value, 'description': description}
+
+
+def is_weak(profile) -> bool:
+    mem_kb = (profile.get('memory') or {}).get('total_kb', 0)
+    cores = (profile.get('cpu') or {}).get('cores', 1)
+    gpu = profile.get('gpu') or []
+    software_gpu = not gpu or all(d in SOFTWARE_GPU_DRIVERS for d in gpu)
+    return bool(mem_kb and mem_kb < WEAK_RAM_KB) or cores <= WEAK_CPU_CORES or software_gpu
+
+
+def _is_iosched(change):
+    return change['kind'] == 'sysfs' and change['id'].startswith('iosched-')
+
+
+def iosched_rules(storage, changes):
+    """udev rules persisting the schedulers of exactly the disks in `changes`."""
+    devices = {d['name']: d for d in storage}
+    lines = ['# Managed by karmaos-tuning']
+    for change in filter(_is_iosched, changes):
+        dev = devices[change['id'][len('iosched-'):]]
+        # The size keeps the rule on this disk should kernel names be reordered
+        lines.append(f'ACTION=="add|change", KERNEL=="{dev["name"]}", '
+                     f'ATTR{{size}}=="{dev["size_bytes"] // 512}", '
+                     f'ATTR{{queue/scheduler}}="{change["value"]}"')
+    return '\n'.join(lines) + '\n'
+
+
+def select(changes, ids, profile):
+    """Keep the changes in `ids`; the udev rule only covers the selected disks.
+
+    swappiness 100 only pays off with zram: with disk swap alone it makes a
+    slow disk thrash, so it is dropped unless zram is selected too.
+    """
+    selected = [c for c in changes if c['id'] in ids]
+    if 'zram' not in ids:
+        selected = [c for c in selected if c['id'] != 'swappiness']
+    schedulers = [c for c in selected if _is_iosched(c)]
+    result = []
+    for change in selected:
+        if change['id'] == 'iosched-rules':
+            if not schedulers:
+                continue
+            change = dict(change, value=iosched_rules(profile.get('storage') or [], schedulers))
+        result.append(change)
+    return result
+
+
+def plan(profile):
+    """Return the reviewed list of changes for a machine profile."""
+    changes = []
+    mem_kb = (profile.get('memory') or {}).get('total_kb', 0)
+    storage = [d for d in (profile.get('storage') or []) if not d.get('removable')]
+    weak = is_weak(profile)
+
+    if mem_kb and mem_kb < ZRAM_MAX_RAM_KB:
+        changes.append(_change(
+            'zram', 'system', 'file', ZRAM_CONF, ZRAM_CONF_CONTENT,
+            "Mémoire d'échange compressée (zram), au prochain démarrage"))
+        changes.append(_change(
+            'swappiness', 'system', 'file', SYSCTL_CONF, SYSCTL_CONF_CONTENT,
+            "Utiliser zram avant de vider le cache disque (swappiness 100)"))
+
+    scheduler_changes = []
+    for dev in storage:
+        wanted = IO_SCHEDULERS.get(dev['kind'])
+        if wanted and wanted in dev['schedulers'] and wanted != dev['scheduler']:
+            scheduler_changes.append(_change(
+                f"iosched-{dev['name']}", 'system', 'sysfs',
+                f"/sys/block/{dev['name']}/queue/scheduler", wanted,
+                f"Ordonnanceur d'E/S « {wanted} » pour {dev['name']} ({dev['kind'].upper()})"))
+    if scheduler_changes:
+        changes.extend(scheduler_changes)
+        changes.append(_change(
+            'iosched-rules', 'system', 'file', UDEV_IOSCHED_RULES,
+            iosched_rules(storage, scheduler_changes),
+            "Conserver ces ordonnanceurs d'E/S après redémarrage"))
+
+    slow_storage = any(d['kind'] in ('hdd', 'emmc') for d in storage)
+    if weak or slow_storage:
+        changes.append(_change(
+            'snap-refresh-window', 'system', 'snap-conf', 'refresh.timer', SNAP_REFRESH_WINDOW,
+            f"Mises à jour des snaps la nuit ({SNAP_REFRESH_WINDOW})"))
+
+    if weak:
+        changes.append(_change(
+            'kwin-blur', 'user', 'kconfig', 'kwinrc:Plugins:blurEnabled', 'false',
+            "Désactiver l'effet de flou de Plasma"))
+        changes.append(_change(
+            'kwin-contrast', 'user', 'kconfig', 'kwinrc:Plugins:contrastEnabled', 'false',
+            "Désactiver l'effet de contraste d'arrière-plan de Plasma"))
+        changes.append(_change(
+            'plasma-animations', 'user', 'kconfig', 'kdeglobals:KDE:AnimationDurationFactor', '0',
+            "Désactiver les animations de Plasma"))
+        changes.append(_change(
+            'baloo', 'user', 'kconfig', 'baloofilerc:Basic Settings:Indexing-Enabled', 'false',
+            "Désactiver l'indexation des fichiers (Baloo)"))
+    return changes
+
+
+# ─────────────────────────────────────────────────────────────
+# Change handlers: apply returns the previous state, revert restores it
+# ─────────────────────────────────────────────────────────────
+def _write_atomic(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.karmaos-')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _apply_file(change):
+    try:
+        with open(change['target'], 'r', encoding='utf-8') as f:
+            previous = f.read()
+    except FileNotFoundError:
+        previous = None
+    _write_atomic(change['target'], change['value'])
+    return previous
+
+
+def _revert_file(entry):
+    if entry['previous'] is None:
+        try:
+            os.unlink(entry['target'])
+        except FileNotFoundError:
+            pass
+    else:
+        _write_atomic(entry['target'], entry['previous'])
+
+
+def _apply_sysfs(change):
+    with open(change['target'], 'r', encoding='utf-8') as f:
+        current = f.read().split()
+    previous = next((s.strip('[]') for s in current if s.startswith('[')), None)
+    with open(change['target'], 'w', encoding='utf-8') as f:
+        f.write(change['value'])
+    return previous
+
+
+def _revert_sysfs(entry):
+    if entry['previous'] and os.path.exists(entry['target']):
+        with open(entry['target'], 'w', encoding='utf-8') as f:
+            f.write(entry['previous'])
+
+
+def _apply_snap_conf(change):
+    ret = subprocess.run(['snap', 'get', 'system', change['target']],
+                         capture_output=True, text=True, timeout=30)
+    previous = ret.stdout.strip() if ret.returncode == 0 and ret.stdout.strip() else None
+    subprocess.run(['snap', 'set', 'system', f"{change['target']}={change['value']}"],
+                   check=True, timeout=30)
+    return previous
+
+
+def _revert_snap_conf(entry):
+    if entry['previous'] is None:
+        subprocess.run(['snap', 'unset', 'system', entry['target']], check=True, timeout=30)
+    else:
+        subprocess.run(['snap', 'set', 'system', f"{entry['target']}={entry['previous']}"],
+                       check=True, timeout=30)
+
+
+def _kconfig_tool(name):
+    for suffix in ('6', '5'):
+        tool = shutil.which(f'{name}{suffix}')
+        if tool:
+            return tool
+    raise FileNotFoundError(f'{name}5/{name}6 not found')
+
+
+def _apply_kconfig(change):
+    file, group, key = change['target'].split(':', 2)
+    ret = subprocess.run([_kconfig_tool('kreadconfig'), '--file', file, '--group', group, '--key', key],
+                         capture_output=True, text=True, timeout=10)
+    previous = ret.stdout.strip() or None
+    subprocess.run([_kconfig_tool('kwriteconfig'), '--file', file, '--group', group, '--key', key,
+                    change['value']], check=True, timeout=10)
+    return previous
+
+
+def _revert_kconfig(entry):
+    file, group, key = entry['target'].split(':', 2)
+    cmd = [_kconfig_tool('kwriteconfig'), '--file', file, '--group', group, '--key', key]
+    if entry['previous'] is None:
+        cmd.append('--delete')
+    else:
+        cmd.append(entry['previous'])
+    subprocess.run(cmd, check=True, timeout=10)
+
+
+# What a system change handed over by the wizard may touch
+_IOSCHED_TARGET = re.compile(r'/sys/block/[\w.-]+/queue/scheduler')
+_IOSCHED_RULE = re.compile(r'ACTION=="add\|change", KERNEL=="[\w.-]+", ATTR\{size\}=="\d+", '
+                           r'ATTR\{queue/scheduler\}="[\w-]+"')
+
+
+def validate(change):
+    """Raise ValueError unless `change` is one plan() can produce."""
+    kind, target, value = change.get('kind'), change.get('target'), change.get('value')
+    if change.get('scope') == 'user' and kind == 'kconfig':
+        return
+    if kind == 'file' and target == ZRAM_CONF and value == ZRAM_CONF_CONTENT:
+        return
+    if kind == 'file' and target == SYSCTL_CONF and value == SYSCTL_CONF_CONTENT:
+        return
+    if kind == 'file' and target == UDEV_IOSCHED_RULES and all(
+            line.startswith('#') or _IOSCHED_RULE.fullmatch(line)
+            for line in value.splitlines()):
+        return
+    if kind == 'sysfs' and _IOSCHED_TARGET.fullmatch(target or '') \
+            and value in IO_SCHEDULERS.values():
+        return
+    if kind == 'snap-conf' and target == 'refresh.timer' and value == SNAP_REFRESH_WINDOW:
+        return
+    raise ValueError(f"{change.get('id')}: not a karmaos-tuning change")
+
+
+HANDLERS = {
+    'file': (_apply_file, _revert_file),
+    'sysfs': (_apply_sysfs, _revert_sysfs),
+    'snap-conf': (_apply_snap_conf, _revert_snap_conf),
+    'kconfig': (_apply_kconfig, _revert_kconfig),
+}
+
+
+# ─────────────────────────────────────────────────────────────
+# Journal
+# ─────────────────────────────────────────────────────────────
+def load_journal(scope):
+    try:
+        with open(journal_path(scope), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def _save_journal(scope, entries):
+    path = journal_path(scope)
+    if entries:
+        _write_atomic(path, json.dumps(entries, indent=2) + '\n')
+    elif os.path.exists(path):
+        os.unlink(path)
+
+
+def apply(changes, scope):
+    """Apply the changes of one scope; return `(applied_ids, errors)`.
+
+    Changes already in the journal are skipped so the original previous
+    state is never overwritten by a second run.
+    """
+    journal = load_journal(scope)
+    done = {entry['id'] for entry in journal}
+    applied, errors = [], []
+    for change in changes:
+        if change['scope'] != scope or change['id'] in done:
+            continue
+        try:
+            previous = HANDLERS[change['kind']][0](change)
+        except Exception as e:
+            errors.append(f"{change['id']}: {e}")
+            continue
+        journal.append(dict(change, previous=previous, applied_at=time.time()))
+        _save_journal(scope, journal)
+        applied.append(change['id'])
+    return applied, errors
+
+
+def revert(scope):
+    """Undo every journaled change of a scope, newest first; return errors."""
+    journal = load_journal(scope)
+    errors = []
+    for entry in reversed(list(journal)):
+        try:
+            HANDLERS[entry['kind']][1](entry)
+        except Exception as e:
+            errors.append(f"{entry['id']}: {e}")
+            continue
+        journal.remove(entry)
+        _save_journal(scope, journal)
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='karmaos-tuning')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('profile')
+    sub.add_parser('plan')
+    for name in ('apply', 'revert'):
+        cmd = sub.add_parser(name)
+        cmd.add_argument('--scope', choices=('system', 'user'), required=True)
+        if name == 'apply':
+            cmd.add_argument('--only', default='', help='comma-separated change ids')
+            cmd.add_argument('--changes', help='JSON list of changes to apply as-is (- for stdin)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'revert':
+        errors = revert(args.scope)
+        print(json.dumps({'errors': errors}, indent=2))
+        return 1 if errors else 0
+
+    if args.command == 'apply' and args.changes:
+        # The exact selection the user confirmed, not a new plan
+        if args.changes == '-':
+            changes = json.load(sys.stdin)
+        else:
+            with open(args.changes, 'r', encoding='utf-8') as f:
+                changes = json.load(f)
+        try:
+            for change in changes:
+                validate(change)
+        except (ValueError, TypeError, AttributeError) as e:
+            print(json.dumps({'applied': [], 'errors': [str(e)]}, indent=2))
+            return 1
+        applied, errors = apply(changes, args.scope)
+        print(json.dumps({'applied': applied, 'errors': errors}, indent=2))
+        return 1 if errors else 0
+
+    profile = profile_machine()
+    if args.command == 'profile':
+        print(json.dumps(profile, indent=2))
+        return 0
+    changes = plan(profile)
+    if args.command == 'plan':
+        print(json.dumps(changes, indent=2, ensure_ascii=False))
+        return 0
+
+    if args.only:
+        changes = select(changes, set(args.only.split(',')), profile)
+    applied, errors = apply(changes, args.scope)
+    print(json.dumps({'applied': applied, 'errors': errors}, indent=2))
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
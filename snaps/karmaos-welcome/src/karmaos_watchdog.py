@@ -0,0 +1,248 @@
+"""
+KarmaOS Welcome - Main-loop stall detector and handler instrumentation
+
+Disabled unless KARMAOS_WELCOME_WATCHDOG=1. Settings (environment):
+    KARMAOS_WELCOME_STALL_MS        stall threshold in ms (default 200)
+    KARMAOS_WELCOME_WATCHDOG_DUMP   JSON stats file, rewritten every few seconds and at exit
+    KARMAOS_WELCOME_DEBUG_PORT      serve the same JSON on http://127.0.0.1:PORT/
+"""
+
+import atexit
+import functools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from gi.repository import GLib
+
+DEFAULT_STALL_MS = 200
+HEARTBEAT_MS = 50
+DUMP_INTERVAL = 5.0
+RECENT_STALLS = 20
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_SELF = os.path.abspath(__file__)
+
+_watchdog = None
+
+
+class Histogram:
+    """Fixed-bucket latency histogram in milliseconds."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, ms):
+        index = next((i for i, bound in enumerate(BUCKETS_MS) if ms <= bound), len(BUCKETS_MS))
+        self.counts[index] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def as_dict(self):
+        labels = [f'<={bound}' for bound in BUCKETS_MS] + ['+inf']
+        return {
+            'count': self.count,
+            'sum_ms': round(self.total, 1),
+            'max_ms': round(self.max, 1),
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+def _copy_stall(stall):
+    if stall is None:
+        return None
+    return dict(stall, stack=list(stall.get('stack', [])))
+
+
+def _frame_label(frame):
+    return f'{os.path.basename(frame.filename)}:{frame.name}'
+
+
+def offending_handler(stack):
+    """Outermost application frame below main(): the callback the main loop is stuck in."""
+    for frame in stack:
+        if (frame.filename.startswith(APP_DIR) and frame.filename != _SELF
+                and frame.name not in ('<module>', 'main')):
+            return _frame_label(frame)
+    return _frame_label(stack[-1]) if stack else '?'
+
+
+class Watchdog:
+    """Heartbeats the GLib main loop from a timeout and watches it from a thread."""
+
+    def __init__(self, threshold_ms=DEFAULT_STALL_MS, dump_path=None, debug_port=None):
+        self.threshold = threshold_ms / 1000.0
+        self.dump_path = dump_path
+        self.debug_port = debug_port
+        self.started = time.monotonic()
+        self.main_thread_id = threading.main_thread().ident
+        self.lock = threading.Lock()
+        self.heartbeat_lag = Histogram()
+        self.stall_durations = Histogram()
+        self.stalls_by_handler = {}
+        self.handlers = {}
+        self.recent_stalls = []
+        self._last_beat = time.monotonic()
+        self._pending = None    # stall seen by the thread, closed by the next beat
+        self._stop = threading.Event()
+        self._source_id = 0
+        self._server = None
+
+    def start(self):
+        self._last_beat = time.monotonic()
+        self._source_id = GLib.timeout_add(HEARTBEAT_MS, self._beat, priority=GLib.PRIORITY_HIGH)
+        threading.Thread(target=self._watch, name='karmaos-watchdog', daemon=True).start()
+        if self.debug_port:
+            self._start_server()
+        atexit.register(self.stop)
+
+    def stop(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if self._source_id:
+            GLib.source_remove(self._source_id)
+            self._source_id = 0
+        if self._server:
+            self._server.shutdown()
+        self.dump()
+
+    # Main thread
+    def _beat(self):
+        now = time.monotonic()
+        with self.lock:
+            elapsed = now - self._last_beat
+            self.heartbeat_lag.record(max(0.0, elapsed * 1000 - HEARTBEAT_MS))
+            if elapsed > self.threshold:
+                # Missed by the thread's poll: sampling here would only show _beat itself
+                stall = self._pending or {
+                    'handler': '?',
+                    'blocked_in': '?',
+                    'at': time.time() - elapsed,
+                    'stack': [],
+                }
+                stall['duration_ms'] = round(elapsed * 1000, 1)
+                self.stall_durations.record(elapsed * 1000)
+                handler = stall['handler']
+                self.stalls_by_handler[handler] = self.stalls_by_handler.get(handler, 0) + 1
+                self.recent_stalls = (self.recent_stalls + [stall])[-RECENT_STALLS:]
+            self._pending = None
+            self._last_beat = now
+        return True
+
+    def record_handler(self, name, ms):
+        with self.lock:
+            self.handlers.setdefault(name, Histogram()).record(ms)
+
+    # Watchdog thread
+    def _watch(self):
+        next_dump = time.monotonic() + DUMP_INTERVAL
+        while not self._stop.wait(HEARTBEAT_MS / 1000.0):
+            now = time.monotonic()
+            with self.lock:
+                if self._pending is None and now - self._last_beat > self.threshold:
+                    self._pending = self._capture(now)
+            if self.dump_path and now >= next_dump:
+                self.dump()
+                next_dump = now + DUMP_INTERVAL
+
+    def _capture(self, now):
+        frame = sys._current_frames().get(self.main_thread_id)
+        stack = traceback.extract_stack(frame) if frame is not None else []
+        return {
+            'handler': offending_handler(stack),
+            'blocked_in': _frame_label(stack[-1]) if stack else '?',
+            'at': time.time() - (now - self._last_beat),
+            'stack': [f'{f.filename}:{f.lineno} {f.name}' for f in stack],
+        }
+
+    # Reporting
+    def stats(self):
+        """Snapshot of the counters; copies, so callers can serialise them outside the lock."""
+        with self.lock:
+            return {
+                'uptime_s': round(time.monotonic() - self.started, 1),
+                'threshold_ms': self.threshold * 1000,
+                'heartbeat_lag_ms': self.heartbeat_lag.as_dict(),
+                'stalls': {
+                    'count': self.stall_durations.count,
+                    'by_handler': dict(self.stalls_by_handler),
+                    'duration_ms': self.stall_durations.as_dict(),
+                    'in_progress': _copy_stall(self._pending),
+                },
+                'handlers_ms': {name: h.as_dict() for name, h in self.handlers.items()},
+                'recent_stalls': [_copy_stall(stall) for stall in self.recent_stalls],
+            }
+
+    def dump(self):
+        if not self.dump_path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.dump_path))
+        try:
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.stats(), f, indent=2)
+            os.replace(tmp, self.dump_path)
+        except OSError:
+            pass
+
+    def _start_server(self):
+        watchdog = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(watchdog.stats(), indent=2).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer(('127.0.0.1', self.debug_port), Handler)
+        except OSError:
+            return
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+
+def instrument(func):
+    """Time a main-loop handler into the watchdog's per-handler histogram."""
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _watchdog is None:
+            return func(*args, **kwargs)
+        started = time.monotonic()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _watchdog.record_handler(name, (time.monotonic() - started) * 1000)
+    return wrapper
+
+
+def start_from_env():
+    """Start the watchdog if KARMAOS_WELCOME_WATCHDOG=1; return it or None."""
+    global _watchdog
+    if os.environ.get('KARMAOS_WELCOME_WATCHDOG') != '1':
+        return None
+    port = os.environ.get('KARMAOS_WELCOME_DEBUG_PORT', '')
+    _watchdog = Watchdog(
+        threshold_ms=int(os.environ.get('KARMAOS_WELCOME_STALL_MS', DEFAULT_STALL_MS)),
+        dump_path=os.environ.get('KARMAOS_WELCOME_WATCHDOG_DUMP') or None,
+        debug_port=int(port) if port.isdigit() else None,
+    )
+    _watchdog.start()
+    return _watchdog
@@ -0,0 +1,181 @@
+"""
+WifiScanner against python-dbusmock's NetworkManager
+Checks the diffs reported for added, removed and changed access points, and
+the connection settings connect_to() hands to NetworkManager.
+
+Needs python-dbusmock, dbus-python, PyGObject and dbus-daemon.
+"""
+
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+try:
+    import dbus
+    import dbusmock
+    from dbusmock.templates.networkmanager import (
+        MOCK_IFACE as NM_MOCK_IFACE, DeviceState, InfrastructureMode, NM80211ApSecurityFlags)
+    from gi.repository import Gio, GLib
+except ImportError as e:
+    raise unittest.SkipTest(f'dbusmock NetworkManager unavailable: {e}')
+
+from karmaos_network import (
+    NM_AP_IFACE, NM_BUS_NAME, NM_IFACE, Network, WifiScanner)
+
+PSK = NM80211ApSecurityFlags.NM_802_11_AP_SEC_KEY_MGMT_PSK
+SAE = NM80211ApSecurityFlags.NM_802_11_AP_SEC_KEY_MGMT_SAE
+OPEN = NM80211ApSecurityFlags.NM_802_11_AP_SEC_NONE
+PRIVACY = 0x1
+
+
+class WifiScannerTest(dbusmock.DBusTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.start_system_bus()
+        cls.dbus_con = cls.get_dbus(system_bus=True)
+
+    def setUp(self):
+        self.p_mock, self.obj_nm = self.spawn_server_template(
+            'networkmanager', {}, stdout=subprocess.DEVNULL)
+        self.nm_mock = dbus.Interface(self.obj_nm, NM_MOCK_IFACE)
+        self.mock = dbus.Interface(self.obj_nm, dbusmock.MOCK_IFACE)
+        self.device = self.nm_mock.AddWiFiDevice('mock_wifi0', 'wlan0', DeviceState.ACTIVATED)
+
+        self.bus = Gio.DBusConnection.new_for_address_sync(
+            os.environ['DBUS_SYSTEM_BUS_ADDRESS'],
+            Gio.DBusConnectionFlags.AUTHENTICATION_CLIENT
+            | Gio.DBusConnectionFlags.MESSAGE_BUS_CONNECTION,
+            None, None)
+        self.diffs = []
+        self.scanner = WifiScanner(lambda *diff: self.diffs.append(diff),
+                                   bus=self.bus, flush_interval=10)
+
+    def tearDown(self):
+        self.scanner.stop()
+        self.bus.close_sync(None)
+        self.p_mock.terminate()
+        self.p_mock.wait()
+
+    # Helpers
+    def add_ap(self, name, ssid, strength=80, security=OPEN):
+        return self.nm_mock.AddAccessPoint(
+            self.device, name, ssid, '00:11:22:33:44:55', InfrastructureMode.NM_802_11_MODE_INFRA,
+            2412, 54000, strength, security)
+
+    def set_ap(self, ap_path, **props):
+        ap = self.dbus_con.get_object(NM_BUS_NAME, ap_path)
+        for name, value in props.items():
+            ap.Set(NM_AP_IFACE, name, value, dbus_interface=dbus.PROPERTIES_IFACE)
+
+    def run_until(self, predicate, timeout=5):
+        context = GLib.MainContext.default()
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            if time.monotonic() > deadline:
+                self.fail('timed out waiting for the scanner')
+            context.iteration(False)
+            time.sleep(0.01)
+
+    def next_diff(self):
+        self.run_until(lambda: self.diffs)
+        return self.diffs.pop(0)
+
+    def settle(self, seconds=0.3):
+        context = GLib.MainContext.default()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            context.iteration(False)
+            time.sleep(0.01)
+
+    def reported_security(self):
+        """Security label of the last network reported as changed."""
+        changed = [net for _added, _removed, nets in self.diffs for net in nets]
+        return changed[-1].security if changed else None
+
+    # Diffs
+    def test_initial_access_points_are_added(self):
+        self.add_ap('home', 'home', strength=80)
+        self.scanner.start()
+        self.assertEqual(self.next_diff(), ([Network('home', 80, '')], [], []))
+
+    def test_added_and_removed_access_points(self):
+        self.scanner.start()
+        self.run_until(lambda: self.scanner.available)
+        ap = self.add_ap('cafe', 'cafe', strength=60)
+        self.assertEqual(self.next_diff(), ([Network('cafe', 60, '')], [], []))
+
+        self.nm_mock.RemoveAccessPoint(self.device, ap)
+        added, removed, changed = self.next_diff()
+        self.assertEqual((added, [n.ssid for n in removed], changed), ([], ['cafe'], []))
+
+    def test_strength_changes_below_the_step_are_not_reported(self):
+        ap = self.add_ap('home', 'home', strength=80)
+        self.scanner.start()
+        self.next_diff()
+
+        self.set_ap(ap, Strength=dbus.Byte(75))
+        self.settle()
+        self.assertEqual(self.diffs, [])
+
+        self.set_ap(ap, Strength=dbus.Byte(30))
+        self.assertEqual(self.next_diff(), ([], [], [Network('home', 30, '')]))
+
+    def test_security_flag_changes_update_the_label(self):
+        ap = self.add_ap('home', 'home', strength=80)
+        self.scanner.start()
+        self.next_diff()
+
+        self.set_ap(ap, Flags=dbus.UInt32(PRIVACY), WpaFlags=dbus.UInt32(PSK))
+        self.run_until(lambda: self.reported_security() == 'WPA')
+        self.set_ap(ap, WpaFlags=dbus.UInt32(0), RsnFlags=dbus.UInt32(PSK))
+        self.run_until(lambda: self.reported_security() == 'WPA2')
+
+    # connect_to
+    def connect(self, ssid, password):
+        self.mock.AddMethod(NM_IFACE, 'AddAndActivateConnection', 'a{sa{sv}}oo', 'oo',
+                            'ret = ("/org/freedesktop/NetworkManager/Settings/1", '
+                            '"/org/freedesktop/NetworkManager/ActiveConnection/1")')
+        results = []
+        self.scanner.connect_to(ssid, password, lambda ok, message: results.append((ok, message)))
+        self.run_until(lambda: results)
+        self.assertEqual(results, [(True, '')])
+        calls = self.mock.GetMethodCalls('AddAndActivateConnection')
+        self.assertEqual(len(calls), 1)
+        settings, device, _ap = calls[0][1]
+        self.assertEqual(device, self.device)
+        return settings
+
+    def secured_ap(self, rsn_flags, label):
+        ap = self.add_ap('home', 'home', strength=80)
+        self.scanner.start()
+        self.next_diff()
+        self.set_ap(ap, Flags=dbus.UInt32(PRIVACY), RsnFlags=dbus.UInt32(rsn_flags))
+        self.run_until(lambda: self.scanner.networks()[0].security == label)
+
+    def test_connect_to_transition_mode_uses_psk(self):
+        self.secured_ap(PSK | SAE, 'WPA3')
+        settings = self.connect('home', 'secret')
+        security = settings['802-11-wireless-security']
+        self.assertEqual(security['key-mgmt'], 'wpa-psk')
+        self.assertEqual(security['psk'], 'secret')
+        self.assertEqual(bytes(settings['802-11-wireless']['ssid']), b'home')
+
+    def test_connect_to_wpa3_only_uses_sae(self):
+        self.secured_ap(SAE, 'WPA3')
+        settings = self.connect('home', 'secret')
+        self.assertEqual(settings['802-11-wireless-security']['key-mgmt'], 'sae')
+
+    def test_connect_to_unknown_network(self):
+        self.scanner.start()
+        results = []
+        self.scanner.connect_to('nowhere', None, lambda ok, message: results.append(ok))
+        self.assertEqual(results, [False])
+
+
+if __name__ == '__main__':
+    unittest.main()
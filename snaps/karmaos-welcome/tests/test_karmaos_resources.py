@@ -0,0 +1,118 @@
+"""
+ResourceCache against a local HTTP server
+Fresh download, ETag revalidation (304) and the offline fallback to the
+cached copy with the time it was last checked.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from karmaos_resources import ResourceCache  # noqa: E402
+
+
+class _Site:
+    """One page with an ETag; records the validators each request carried."""
+
+    def __init__(self):
+        self.body = '<a href="https://karmaos.ovh/docs">Docs</a>'
+        self.etag = '"v1"'
+        self.requests = []
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.requests.append(self.headers.get('If-None-Match'))
+                if self.headers.get('If-None-Match') == site.etag:
+                    self.send_response(304)
+                    self.send_header('ETag', site.etag)
+                    self.end_headers()
+                    return
+                body = site.body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('ETag', site.etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ResourceCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.snapshot = os.path.join(self.tmp, 'snapshot.html')
+        with open(self.snapshot, 'w', encoding='utf-8') as f:
+            f.write('<p>bundled</p>')
+        self.site = _Site()
+        self.addCleanup(self.site.stop)
+        self.cache = ResourceCache(self.snapshot, url=self.site.url,
+                                   cache_dir=os.path.join(self.tmp, 'cache'), timeout=5)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_snapshot_until_first_download(self):
+        self.assertEqual(self.cache.load(), ('<p>bundled</p>', None))
+
+    def test_fresh_download(self):
+        self.assertTrue(self.cache.refresh())
+        html, checked_at = self.cache.load()
+        self.assertEqual(html, self.site.body)
+        self.assertIsNotNone(checked_at)
+        self.assertEqual(self.site.requests, [None])
+
+    def test_revalidation_with_etag(self):
+        self.cache.refresh()
+        _html, first_check = self.cache.load()
+
+        self.assertFalse(self.cache.refresh())
+        html, checked_at = self.cache.load()
+        self.assertEqual(self.site.requests, [None, '"v1"'])
+        self.assertEqual(html, self.site.body)
+        self.assertGreaterEqual(checked_at, first_check)
+
+        self.site.body = '<a href="https://karmaos.ovh/new">New</a>'
+        self.site.etag = '"v2"'
+        self.assertTrue(self.cache.refresh())
+        self.assertEqual(self.cache.load()[0], self.site.body)
+
+    def test_offline_keeps_the_cached_copy_and_its_timestamp(self):
+        self.cache.refresh()
+        cached = self.cache.load()
+        self.site.stop()
+
+        with self.assertRaises(urllib.error.URLError):
+            self.cache.refresh()
+        html, checked_at = self.cache.load()
+        self.assertEqual((html, checked_at), cached)
+        # The page shows when the copy was last checked, not the bundled label
+        self.assertIsNotNone(checked_at)
+
+    def test_cache_of_another_url_is_ignored(self):
+        self.cache.refresh()
+        other = ResourceCache(self.snapshot, url=self.site.url + 'other/',
+                              cache_dir=self.cache.cache_dir)
+        self.assertEqual(other.load(), ('<p>bundled</p>', None))
+
+
+if __name__ == '__main__':
+    unittest.main()